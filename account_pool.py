@@ -0,0 +1,199 @@
+import asyncio
+import json
+import random
+import time
+
+import asyncpraw
+from asyncprawcore.exceptions import TooManyRequests
+
+from metrics import Metrics
+from raw_info import RawRedditClient, create_session
+
+MAX_BACKOFF = 600
+# Optional credential keys that point an account at another endpoint (e.g. benchmarks/fake_reddit.py)
+ENDPOINT_SETTINGS = ('oauth_url', 'reddit_url')
+# Quota assumed for an account that has not made a request yet
+DEFAULT_REMAINING = 100
+
+
+def load_credentials(auth):
+    """Load credentials from a comma-separated list of files, each holding a dict or a list of dicts."""
+    credentials = []
+    for auth_file in auth.split(','):
+        with open(auth_file.strip()) as f:
+            auth_data = json.load(f)
+        if isinstance(auth_data, dict):
+            auth_data = [auth_data]
+        credentials.extend(auth_data)
+
+    if not credentials:
+        raise ValueError(f"No credentials found in {auth}")
+    return credentials
+
+
+class RedditAccount:
+    """One set of credentials together with its scheduling state."""
+
+    def __init__(self, auth_data, index=0):
+        self.reddit = asyncpraw.Reddit(
+            client_id=auth_data['client_id'],
+            client_secret=auth_data['client_secret'],
+            user_agent=auth_data['user_agent'],
+            username=auth_data['username'],
+            password=auth_data['password'],
+            **{key: auth_data[key] for key in ENDPOINT_SETTINGS if key in auth_data}
+        )
+        self.label = auth_data.get('username') or f"account_{index}"
+        self.in_flight = 0
+        self.strikes = 0
+        self.backoff_until = 0.0
+
+    def limits(self):
+        return self.reddit.auth.limits
+
+    def available(self, now):
+        """Return how many requests this account can issue now and the rate at which it can spend them."""
+        if now < self.backoff_until:
+            return 0, 0.0
+
+        limits = self.limits()
+        remaining = limits['remaining']
+        reset_timestamp = limits['reset_timestamp']
+        if remaining is None or reset_timestamp is None or now >= reset_timestamp:
+            # Unknown or expired window: let the account be probed first
+            return DEFAULT_REMAINING - self.in_flight, float('inf')
+
+        available = remaining - self.in_flight
+        return available, available / max(reset_timestamp - now, 1.0)
+
+    def ready_at(self, now):
+        """Return the earliest time at which this account may have quota again."""
+        if now < self.backoff_until:
+            return self.backoff_until
+        reset_timestamp = self.limits()['reset_timestamp']
+        return reset_timestamp if reset_timestamp is not None else now
+
+    async def info(self, fullnames):
+        return [item async for item in self.reddit.info(fullnames=fullnames)]
+
+    async def close(self):
+        await self.reddit.close()
+
+
+class RawRedditAccount(RedditAccount):
+    """Account whose info calls go straight to the API and return raw data dicts."""
+
+    def __init__(self, auth_data, index=0, session=None):
+        self.client = RawRedditClient(auth_data, session)
+        self.label = auth_data.get('username') or f"account_{index}"
+        self.in_flight = 0
+        self.strikes = 0
+        self.backoff_until = 0.0
+
+    def limits(self):
+        return self.client.limits
+
+    async def info(self, fullnames):
+        return await self.client.info(fullnames)
+
+    async def close(self):
+        pass
+
+
+ENGINES = ('asyncpraw', 'raw')
+
+
+class AccountPool:
+    """Spreads info calls over several accounts according to their rate-limit headers.
+
+    Accounts that hit a 429 are put in backoff on their own; the others keep serving requests.
+    """
+
+    def __init__(self, credentials, error_logger=None, engine='asyncpraw', metrics=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine}, expected one of {', '.join(ENGINES)}")
+        self.engine = engine
+        self.session = None
+        if engine == 'raw':
+            self.session = create_session()
+            self.accounts = [RawRedditAccount(auth_data, i, self.session) for i, auth_data in enumerate(credentials)]
+        else:
+            self.accounts = [RedditAccount(auth_data, i) for i, auth_data in enumerate(credentials)]
+        self.error_logger = error_logger
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._condition = None
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def _pick(self):
+        now = time.time()
+        best = None
+        best_rate = 0.0
+        for account in self.accounts:
+            available, rate = account.available(now)
+            if available > 0 and (best is None or rate > best_rate):
+                best, best_rate = account, rate
+
+        if best is not None:
+            return best, None
+
+        wait = min(account.ready_at(now) for account in self.accounts) - now
+        return None, min(max(wait, 0.1), MAX_BACKOFF)
+
+    async def acquire(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+
+        async with self._condition:
+            while True:
+                account, wait = self._pick()
+                if account is not None:
+                    account.in_flight += 1
+                    return account
+                try:
+                    await asyncio.wait_for(self._condition.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, account):
+        async with self._condition:
+            account.in_flight -= 1
+            self._condition.notify_all()
+
+    def backoff(self, account, retry_after=None, error_logger=None):
+        account.strikes += 1
+        if retry_after is not None:
+            delay = float(retry_after)
+        else:
+            delay = min(2 ** account.strikes, MAX_BACKOFF) * (1 + random.random())
+        account.backoff_until = time.time() + delay
+        error_logger = error_logger or self.error_logger
+        if error_logger is not None:
+            error_logger.error(f"Rate limited on account {account.label}, backing off for {delay:.1f}s")
+
+    async def info(self, fullnames, error_logger=None):
+        """Fetch one batch of fullnames, moving to another account whenever one is rate limited."""
+        while True:
+            start = time.perf_counter()
+            account = await self.acquire()
+            call_start = time.perf_counter()
+            self.metrics.add_stage_time('acquire', call_start - start)
+            self.metrics.count('info_calls')
+            try:
+                items = await account.info(fullnames)
+            except TooManyRequests as e:
+                self.metrics.count('rate_limited')
+                self.backoff(account, e.retry_after, error_logger)
+                continue
+            finally:
+                self.metrics.observe_latency('info', time.perf_counter() - call_start)
+                await self.release(account)
+            account.strikes = 0
+            return items
+
+    async def close(self):
+        for account in self.accounts:
+            await account.close()
+        if self.session is not None:
+            await self.session.close()
@@ -0,0 +1,190 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_reddit import credentials, serve
+from reddit_ids import DATATYPES, b36encode
+from scrape_submissions_split_zstd import scrape_split_files
+from split_ids import split_ids
+
+DATASET = 'bench'
+# First decoded ID of the synthetic ID lists (IDs are consecutive from here)
+FIRST_ID = {'submissions': 36**6, 'comments': 36**7}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Fake Reddit server did not start on port {port}")
+
+
+def cpu_seconds():
+    # Scraper processes count once they have been joined
+    self, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return self.ru_utime + self.ru_stime + children.ru_utime + children.ru_stime
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux; for children it is the largest single process
+    return max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)) / 1024
+
+
+def write_id_lists(base_folder, datatypes, records):
+    """Write the CSV of IDs that query_dump_ids.py would export and return {datatype: path}."""
+    os.makedirs(os.path.join(base_folder, 'data/ids'), exist_ok=True)
+    id_files = {}
+    for datatype in datatypes:
+        id_file = os.path.join(base_folder, 'data/ids', f'{DATATYPES[datatype][0]}_{DATASET}.csv')
+        with open(id_file, 'w') as f:
+            f.writelines(f"{b36encode(FIRST_ID[datatype] + i)}\n" for i in range(records))
+        id_files[datatype] = id_file
+    return id_files
+
+
+def split_jobs(base_folder, datatypes):
+    jobs = []
+    for datatype in datatypes:
+        split_folder = os.path.join(base_folder, 'data/ids/batched', f'{DATATYPES[datatype][0]}_{DATASET}')
+        jobs += [(datatype, os.path.join(split_folder, f)) for f in sorted(os.listdir(split_folder)) if f.endswith('.txt')]
+    return jobs
+
+
+def written_records(base_folder, datatypes):
+    # Every split file leaves a JSON summary of its metrics next to its logs
+    records = 0
+    for datatype in datatypes:
+        log_folder = os.path.join(base_folder, f'log/{datatype}_{DATASET}')
+        for f in os.listdir(log_folder):
+            if f.endswith('_metrics.json'):
+                with open(os.path.join(log_folder, f)) as summary:
+                    records += json.load(summary)['records']
+    return records
+
+
+def scrape(base_folder, jobs, auth_file, args, queue_file=None):
+    asyncio.run(scrape_split_files(base_folder, DATASET, jobs, auth_file, workers=args.workers, engine=args.engine,
+                                   concurrency=args.concurrency, metrics_interval=3600, queue_file=queue_file))
+
+
+def scrape_processes(base_folder, jobs, auth_file, args, run):
+    """Scrape with args.processes processes that claim split files from a shared lease table."""
+    queue_file = os.path.join(base_folder, f'queue_{run}.sqlite')
+    processes = [multiprocessing.Process(target=scrape, args=(base_folder, jobs, auth_file, args, queue_file)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        if process.exitcode != 0:
+            raise RuntimeError(f"Scraper process exited with code {process.exitcode}")
+
+
+def run(args, base_folder):
+    datatypes = ['submissions', 'comments'] if args.datatype == 'both' else [args.datatype]
+
+    id_files = write_id_lists(base_folder, datatypes, args.records)
+    start, cpu_start = time.perf_counter(), cpu_seconds()
+    for id_file in id_files.values():
+        split_ids(id_file, args.split_size)
+    split_elapsed, split_cpu = time.perf_counter() - start, cpu_seconds() - cpu_start
+    jobs = split_jobs(base_folder, datatypes)
+
+    auth_file = os.path.join(base_folder, 'auth.json')
+    with open(auth_file, 'w') as f:
+        json.dump(credentials(f'http://127.0.0.1:{args.port}', args.accounts), f)
+
+    runs = []
+    for i in range(args.repeat):
+        start, cpu_start = time.perf_counter(), cpu_seconds()
+        if args.processes > 1:
+            scrape_processes(base_folder, jobs, auth_file, args, i)
+        else:
+            scrape(base_folder, jobs, auth_file, args)
+        elapsed, cpu = time.perf_counter() - start, cpu_seconds() - cpu_start
+        records = written_records(base_folder, datatypes)
+        runs.append({
+            'seconds': elapsed,
+            'records': records,
+            'records_per_second': records / elapsed,
+            'cpu_us_per_record': cpu / records * 1e6 if records else None,
+        })
+
+    return {
+        'config': {key: value for key, value in vars(args).items() if key not in ('basefolder', 'output', 'port')},
+        'split_ids_per_second': args.records * len(datatypes) / split_elapsed,
+        'split_cpu_us_per_id': split_cpu / (args.records * len(datatypes)) * 1e6,
+        'records_per_second': statistics.median(run['records_per_second'] for run in runs),
+        'cpu_us_per_record': statistics.median(run['cpu_us_per_record'] for run in runs if run['cpu_us_per_record'] is not None),
+        'peak_rss_mb': peak_rss_mb(),
+        'runs': runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmark of split_ids and scrape_split_files against a local fake Reddit')
+    parser.add_argument('--records', type=int, default=20000, help='Number of IDs per datatype')
+    parser.add_argument('--datatype', type=str, choices=['submissions', 'comments', 'both'], default='submissions', help='Type of data to scrape')
+    parser.add_argument('--engine', type=str, choices=['asyncpraw', 'raw'], default='raw', help='Fetch engine to benchmark')
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of info batches in flight per worker')
+    parser.add_argument('--workers', type=int, default=1, help='Number of split files scraped concurrently')
+    parser.add_argument('--processes', type=int, default=1, help='Number of scraper processes sharing split files through a lease table')
+    parser.add_argument('--accounts', type=int, default=4, help='Number of fake accounts')
+    parser.add_argument('--split_size', type=int, default=10000, help='Number of IDs per split file')
+    parser.add_argument('--latency', type=float, default=0.05, help='Mean seconds per info call')
+    parser.add_argument('--latency_jitter', type=float, default=0.5, help='Relative spread of the latency')
+    parser.add_argument('--missing_rate', type=float, default=0.05, help='Fraction of IDs that are not returned')
+    parser.add_argument('--rate_limit_rate', type=float, default=0.0, help='Fraction of info calls answered with a 429')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the fake server')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of scrape runs; the median is reported')
+    parser.add_argument('--basefolder', type=str, default=None, help='Folder for the benchmark data (default: a temporary folder)')
+    parser.add_argument('--output', type=str, default=None, help='Also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    # The server runs in its own process so its CPU time is not counted against the scraper
+    args.port = free_port()
+    server = multiprocessing.Process(target=serve, args=(args.port,), daemon=True, kwargs={
+        'latency': args.latency, 'latency_jitter': args.latency_jitter, 'missing_rate': args.missing_rate,
+        'rate_limit_rate': args.rate_limit_rate, 'seed': args.seed,
+    })
+    server.start()
+    try:
+        wait_for_port(args.port)
+        if args.basefolder:
+            results = run(args, args.basefolder)
+        else:
+            with tempfile.TemporaryDirectory() as base_folder:
+                results = run(args, base_folder)
+    finally:
+        server.terminate()
+        server.join()
+
+    print(f"split_ids:    {results['split_ids_per_second']:>12,.0f} IDs/s {results['split_cpu_us_per_id']:>8.2f} us CPU/ID")
+    print(f"scrape:       {results['records_per_second']:>12,.0f} records/s {results['cpu_us_per_record']:>8.1f} us CPU/record")
+    print(f"peak RSS:     {results['peak_rss_mb']:>12,.1f} MB")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncpraw
+
+from benchmarks.synthetic import make_submission_data
+from reddit_ids import b36encode
+from serializers import SubmissionSerializer, orjson
+
+
+def legacy_serialize(submission):
+    """The serialization loop scrape_submissions used before serializers.SubmissionSerializer."""
+    submission_data = vars(submission)
+
+    if '_reddit' in submission_data:
+        submission_data.pop('_reddit')
+    if 'comments' in submission_data:
+        submission_data.pop('comments')
+    if 'selftext_html' in submission_data:
+        submission_data.pop('selftext_html')
+    if 'subreddit' in submission_data:
+        submission_data['subreddit'] = submission_data['subreddit'].display_name
+    if 'author' in submission_data:
+        submission_data['author'] = submission_data['author'].name if submission_data['author'] else None
+    if 'poll_data' in submission_data:
+        poll_data = submission_data['poll_data']
+        if poll_data:
+            submission_data['poll_data'] = {
+                'options': [
+                    {
+                        'text': option.text,
+                        'vote_count': option.vote_count,
+                        'id': option.id
+                    }
+                    for option in poll_data.options
+                ] if hasattr(poll_data, 'options') else [],
+                'total_vote_count': poll_data.total_vote_count if hasattr(poll_data, 'total_vote_count') else None,
+                'user_selection': poll_data.user_selection.text if hasattr(poll_data, 'user_selection') and poll_data.user_selection else None,
+                'voting_end_timestamp': poll_data.voting_end_timestamp if hasattr(poll_data, 'voting_end_timestamp') else None
+            }
+        else:
+            submission_data['poll_data'] = None
+
+    non_serializable_keys = []
+    for key, value in submission_data.items():
+        try:
+            json.dumps(value)
+        except TypeError:
+            non_serializable_keys.append(key)
+
+    for key in non_serializable_keys:
+        submission_data.pop(key)
+
+    if non_serializable_keys:
+        return None
+
+    submission_data['retrieved_utc'] = int(datetime.now().timestamp())
+
+    return json.dumps(submission_data).encode('utf-8') + b'\n'
+
+
+def make_submissions(reddit, n, seed):
+    rng = random.Random(seed)
+    return [
+        reddit._objector.objectify({'kind': 't3', 'data': make_submission_data(b36encode(10**9 + i), rng)})
+        for i in range(n)
+    ]
+
+
+def bench(name, serialize, submissions):
+    start = time.perf_counter()
+    total_bytes = 0
+    for submission in submissions:
+        line = serialize(submission)
+        total_bytes += len(line)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} {len(submissions) / elapsed:>12,.0f} records/s {total_bytes / elapsed / 2**20:>8.1f} MB/s")
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Microbenchmark of the submission serializer')
+    parser.add_argument('--records', type=int, default=20000, help='Number of synthetic submissions')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic payloads')
+    args = parser.parse_args()
+
+    reddit = asyncpraw.Reddit(client_id='bench', client_secret='bench', user_agent='refresh_shift benchmark')
+    serializer = SubmissionSerializer()
+
+    # Both serializers get their own objects: the legacy one mutates vars(submission) in place
+    legacy = bench('legacy', legacy_serialize, make_submissions(reddit, args.records, args.seed))
+    schema = bench('schema', serializer.serialize, make_submissions(reddit, args.records, args.seed))
+    print(f"speedup: {legacy / schema:.2f}x (encoder: {'orjson' if orjson is not None else 'json'})")
+
+    await reddit.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
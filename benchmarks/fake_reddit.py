@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+
+from benchmarks.synthetic import make_comment_data, make_submission_data
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Number of distinct synthetic payloads per kind; items are stamped with their own ID on the way out
+TEMPLATES = 1000
+
+
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+class FakeReddit:
+    """Stand-in for Reddit's OAuth token and /api/info endpoints, serving synthetic t1/t3 payloads.
+
+    Which IDs are missing and which payload an ID gets only depend on the seed, so runs with the same
+    seed return the same items. Latency is drawn uniformly from latency * (1 +/- latency_jitter).
+    Each token gets quota requests per window seconds, reported in x-ratelimit-* headers like Reddit
+    does; going over it, or a rate_limit_rate coin flip, answers with a 429.
+    """
+
+    def __init__(self, latency=0.05, latency_jitter=0.5, missing_rate=0.05, rate_limit_rate=0.0, quota=10**6, window=600, seed=0):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.missing_rate = missing_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.quota = quota
+        self.window = window
+        self.seed = seed
+        self.rng = random.Random(seed)
+
+        rng = random.Random(seed)
+        self.templates = {
+            't3': [make_submission_data('0', rng) for _ in range(TEMPLATES)],
+            't1': [make_comment_data('0', rng) for _ in range(TEMPLATES)],
+        }
+        self.tokens = {}
+
+    def _hash(self, fullname):
+        return zlib.crc32(f"{self.seed}:{fullname}".encode())
+
+    def item(self, fullname):
+        """Return the listing child for fullname, or None if it is missing."""
+        kind, _, id_ = fullname.partition('_')
+        if kind not in self.templates:
+            return None
+        h = self._hash(fullname)
+        if h / 2**32 < self.missing_rate:
+            return None
+        data = dict(self.templates[kind][h % TEMPLATES], id=id_, name=fullname)
+        if kind == 't3':
+            data['permalink'] = f"/r/{data['subreddit']}/comments/{id_}/post/"
+        return {'kind': kind, 'data': data}
+
+    async def access_token(self, request):
+        token = f"fake_{len(self.tokens)}"
+        self.tokens[token] = [0, time.time()]
+        return web.json_response({'access_token': token, 'token_type': 'bearer', 'expires_in': 86400, 'scope': '*'})
+
+    async def info(self, request):
+        token = request.headers.get('Authorization', '').split(' ', 1)[-1]
+        if token not in self.tokens:
+            return web.Response(status=401)
+
+        now = time.time()
+        usage = self.tokens[token]
+        if now >= usage[1] + self.window:
+            usage[:] = [0, now]
+        usage[0] += 1
+        headers = {
+            'x-ratelimit-remaining': str(float(max(self.quota - usage[0], 0))),
+            'x-ratelimit-used': str(usage[0]),
+            'x-ratelimit-reset': str(int(usage[1] + self.window - now)),
+        }
+        if usage[0] > self.quota or self.rng.random() < self.rate_limit_rate:
+            return web.Response(status=429, headers=headers)
+
+        await asyncio.sleep(self.latency * self.rng.uniform(1 - self.latency_jitter, 1 + self.latency_jitter))
+
+        children = [item for item in map(self.item, request.query.get('id', '').split(',')) if item is not None]
+        listing = {'kind': 'Listing', 'data': {'after': None, 'dist': len(children), 'modhash': None, 'geo_filter': '',
+                                               'children': children, 'before': None}}
+        return web.Response(body=dumps(listing), content_type='application/json', headers=headers)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/api/v1/access_token', self.access_token)
+        app.router.add_get('/api/info', self.info)
+        app.router.add_get('/api/info/', self.info)
+        return app
+
+
+def serve(port, host='127.0.0.1', **options):
+    web.run_app(FakeReddit(**options).app(), host=host, port=port, print=None)
+
+
+def credentials(base_url, accounts=1):
+    """Credentials that point both engines at a fake server listening on base_url."""
+    return [
+        {
+            'client_id': f'bench_{i}', 'client_secret': 'bench', 'user_agent': 'refresh_shift benchmark',
+            'username': f'bench_{i}', 'password': 'bench', 'oauth_url': base_url, 'reddit_url': base_url,
+        }
+        for i in range(accounts)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a fake Reddit OAuth and /api/info endpoint with synthetic payloads')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.05, help='Mean seconds per info call')
+    parser.add_argument('--latency_jitter', type=float, default=0.5, help='Relative spread of the latency')
+    parser.add_argument('--missing_rate', type=float, default=0.05, help='Fraction of IDs that are not returned')
+    parser.add_argument('--rate_limit_rate', type=float, default=0.0, help='Fraction of info calls answered with a 429')
+    parser.add_argument('--quota', type=int, default=10**6, help='Requests per token and window before 429s')
+    parser.add_argument('--window', type=int, default=600, help='Rate-limit window in seconds')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for payloads, missing IDs and latency')
+    args = parser.parse_args()
+
+    serve(args.port, args.host, latency=args.latency, latency_jitter=args.latency_jitter, missing_rate=args.missing_rate,
+          rate_limit_rate=args.rate_limit_rate, quota=args.quota, window=args.window, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
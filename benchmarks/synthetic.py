@@ -0,0 +1,99 @@
+import random
+import string
+
+from reddit_ids import b36encode
+
+SUBREDDITS = ('AskReddit', 'worldnews', 'science', 'politics', 'Python', 'europe', 'pics', 'gaming')
+REMOVED_BY_CATEGORY = (None, None, None, None, 'deleted', 'moderator', 'reddit', 'automod_filtered')
+
+
+def random_text(rng, min_words, max_words):
+    return ' '.join(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(rng.randint(min_words, max_words)))
+
+
+def make_submission_data(id_, rng=random):
+    """Return a /api/info t3 data payload with the fields and value shapes Reddit sends."""
+    subreddit = rng.choice(SUBREDDITS)
+    created_utc = float(rng.randint(1136073600, 1704067200))
+    is_self = rng.random() < 0.5
+    selftext = random_text(rng, 0, 120) if is_self else ''
+    author = '[deleted]' if rng.random() < 0.15 else f"user_{rng.randint(0, 10**6)}"
+    score = int(rng.paretovariate(1.2))
+    has_poll = rng.random() < 0.01
+
+    data = {
+        'approved_at_utc': None, 'subreddit': subreddit, 'selftext': selftext,
+        'author_fullname': None if author == '[deleted]' else f"t2_{b36encode(rng.randint(10**6, 10**9))}",
+        'saved': False, 'mod_reason_title': None, 'gilded': 0, 'clicked': False,
+        'title': random_text(rng, 3, 25), 'link_flair_richtext': [], 'subreddit_name_prefixed': f"r/{subreddit}",
+        'hidden': False, 'pwls': 6, 'link_flair_css_class': None, 'downs': 0, 'thumbnail_height': None,
+        'top_awarded_type': None, 'hide_score': False, 'name': f"t3_{id_}", 'quarantine': False,
+        'link_flair_text_color': 'dark', 'upvote_ratio': round(rng.random(), 2),
+        'author_flair_background_color': None, 'subreddit_type': 'public', 'ups': score,
+        'total_awards_received': 0, 'media_embed': {}, 'thumbnail_width': None,
+        'author_flair_template_id': None, 'is_original_content': False, 'user_reports': [],
+        'secure_media': None, 'is_reddit_media_domain': False, 'is_meta': False, 'category': None,
+        'secure_media_embed': {}, 'link_flair_text': None, 'can_mod_post': False, 'score': score,
+        'approved_by': None, 'is_created_from_ads_ui': False, 'author_premium': False,
+        'thumbnail': 'self' if is_self else 'default', 'edited': False, 'author_flair_css_class': None,
+        'author_flair_richtext': [], 'gildings': {}, 'content_categories': None, 'is_self': is_self,
+        'mod_note': None, 'created': created_utc, 'link_flair_type': 'text', 'wls': 6,
+        'removed_by_category': rng.choice(REMOVED_BY_CATEGORY), 'banned_by': None,
+        'author_flair_type': 'text', 'domain': f"self.{subreddit}" if is_self else 'example.com',
+        'allow_live_comments': False, 'selftext_html': f"<div class=\"md\"><p>{selftext}</p></div>" if selftext else None,
+        'likes': None, 'suggested_sort': None, 'banned_at_utc': None, 'view_count': None, 'archived': True,
+        'no_follow': rng.random() < 0.5, 'is_crosspostable': False, 'pinned': False, 'over_18': rng.random() < 0.05,
+        'all_awardings': [], 'awarders': [], 'media_only': False, 'can_gild': False, 'spoiler': False,
+        'locked': False, 'author_flair_text': None, 'treatment_tags': [], 'visited': False, 'removed_by': None,
+        'num_reports': None, 'distinguished': None, 'subreddit_id': f"t5_{b36encode(rng.randint(10**4, 10**7))}",
+        'author_is_blocked': False, 'mod_reason_by': None, 'removal_reason': None,
+        'link_flair_background_color': '', 'id': id_, 'is_robot_indexable': True, 'report_reasons': None,
+        'author': author, 'discussion_type': None, 'num_comments': int(rng.paretovariate(1.5)) - 1,
+        'send_replies': True, 'whitelist_status': 'all_ads', 'contest_mode': False, 'mod_reports': [],
+        'author_patreon_flair': False, 'author_flair_text_color': None,
+        'permalink': f"/r/{subreddit}/comments/{id_}/post/", 'stickied': False,
+        'url': f"https://www.reddit.com/r/{subreddit}/comments/{id_}/post/" if is_self else f"https://example.com/{id_}",
+        'subreddit_subscribers': rng.randint(1000, 40000000), 'created_utc': created_utc, 'num_crossposts': 0,
+        'media': None, 'is_video': False,
+    }
+    # Reddit only sends poll_data for poll posts
+    if has_poll:
+        data['poll_data'] = {
+            'options': [{'text': random_text(rng, 1, 4), 'id': str(i), 'vote_count': rng.randint(0, 500)} for i in range(3)],
+            'total_vote_count': rng.randint(0, 1500), 'user_selection': None,
+            'voting_end_timestamp': int(created_utc * 1000) + 3 * 86400000,
+        }
+    return data
+
+
+def make_comment_data(id_, rng=random):
+    """Return a /api/info t1 data payload with the fields and value shapes Reddit sends."""
+    subreddit = rng.choice(SUBREDDITS)
+    created_utc = float(rng.randint(1136073600, 1704067200))
+    author = '[deleted]' if rng.random() < 0.15 else f"user_{rng.randint(0, 10**6)}"
+    body = '[deleted]' if author == '[deleted]' else random_text(rng, 1, 80)
+    score = int(rng.paretovariate(1.3)) - 1
+    link_id = f"t3_{b36encode(rng.randint(10**8, 10**9))}"
+    parent_id = link_id if rng.random() < 0.4 else f"t1_{b36encode(rng.randint(10**9, 10**10))}"
+
+    return {
+        'subreddit_id': f"t5_{b36encode(rng.randint(10**4, 10**7))}", 'approved_at_utc': None,
+        'author_is_blocked': False, 'comment_type': None, 'awarders': [], 'mod_reason_by': None,
+        'banned_by': None, 'author_flair_type': 'text', 'total_awards_received': 0, 'subreddit': subreddit,
+        'author_flair_template_id': None, 'likes': None, 'replies': '', 'user_reports': [], 'saved': False,
+        'id': id_, 'banned_at_utc': None, 'mod_reason_title': None, 'gilded': 0, 'archived': True,
+        'collapsed_reason_code': None, 'no_follow': rng.random() < 0.5, 'author': author, 'can_mod_post': False,
+        'created_utc': created_utc, 'send_replies': True, 'parent_id': parent_id, 'score': score,
+        'author_fullname': None if author == '[deleted]' else f"t2_{b36encode(rng.randint(10**6, 10**9))}",
+        'approved_by': None, 'mod_note': None, 'all_awardings': [], 'collapsed': False, 'body': body,
+        'edited': False, 'top_awarded_type': None, 'author_flair_css_class': None, 'name': f"t1_{id_}",
+        'is_submitter': False, 'downs': 0, 'author_flair_richtext': [], 'author_patreon_flair': False,
+        'body_html': f"<div class=\"md\"><p>{body}</p></div>", 'removal_reason': None, 'collapsed_reason': None,
+        'distinguished': None, 'associated_award': None, 'stickied': False, 'author_premium': False,
+        'can_gild': False, 'gildings': {}, 'unrepliable_reason': None, 'author_flair_text_color': None,
+        'score_hidden': False, 'permalink': f"/r/{subreddit}/comments/{link_id[3:]}/post/{id_}/",
+        'subreddit_type': 'public', 'locked': False, 'report_reasons': None, 'created': created_utc,
+        'link_id': link_id, 'author_flair_text': None, 'treatment_tags': [], 'subreddit_name_prefixed': f"r/{subreddit}",
+        'controversiality': int(rng.random() < 0.05), 'author_flair_background_color': None,
+        'collapsed_because_crowd_control': None, 'mod_reports': [], 'num_reports': None, 'ups': score,
+    }
@@ -0,0 +1,277 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import zstandard as zstd
+
+from frame_index import build_index, index_path
+from reddit_ids import b36decode
+from serializers import dumps, loads
+from zstd_dict import iter_lines
+
+# A delta run leaves the base snapshot {name}.ndjson.zst alone and writes {name}.delta_{N}.zst next to
+# it, holding one entry per scraped ID:
+#   - the full record, for IDs whose content changed and are not in the base (or without field diffs)
+#   - {"id", "retrieved_utc", "_diff": {changed fields}, "_removed": [fields]}, relative to the base record
+#   - {"id", "retrieved_utc", "_unchanged": true}, for IDs whose content is the same as in the previous view
+# The view of a split file is its base with the latest entry of each ID applied. Deltas do not end in
+# .ndjson.zst, so tools reading output files see the base only unless they read the view.
+DELTA_FILE = re.compile(r'\.delta_(\d+)\.zst$')
+OUTPUT_EXTENSION = '.ndjson.zst'
+DIFF_KEY = '_diff'
+REMOVED_KEY = '_removed'
+UNCHANGED_KEY = '_unchanged'
+# Left out of the content hash, so a record that was only fetched again counts as unchanged
+VOLATILE_FIELDS = frozenset(('retrieved_utc',))
+# Records per zstd frame of compacted output
+LINES_PER_FRAME = 1000
+_MISSING = object()
+
+
+def output_stem(outfile):
+    return outfile[:-len(OUTPUT_EXTENSION)] if outfile.endswith(OUTPUT_EXTENSION) else outfile
+
+
+def delta_path(outfile, number):
+    return f"{output_stem(outfile)}.delta_{number:03}.zst"
+
+
+def delta_files(outfile):
+    """Return the delta files of a base snapshot, oldest first."""
+    folder, stem = os.path.split(output_stem(outfile))
+    if not os.path.isdir(folder or '.'):
+        return []
+    numbers = []
+    for f in os.listdir(folder or '.'):
+        match = DELTA_FILE.search(f)
+        if match and f[:match.start()] == stem:
+            numbers.append(int(match.group(1)))
+    return [delta_path(outfile, number) for number in sorted(numbers)]
+
+
+def next_delta_path(outfile):
+    deltas = delta_files(outfile)
+    return delta_path(outfile, int(DELTA_FILE.search(deltas[-1]).group(1)) + 1 if deltas else 1)
+
+
+def hashes_path(outfile):
+    return outfile + '.hashes.npz'
+
+
+def content_hash(record):
+    """64-bit hash of a record's content, independent of key order and of when it was retrieved."""
+    content = {key: value for key, value in record.items() if key not in VOLATILE_FIELDS}
+    data = dumps(content, default=str, sort_keys=True)
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little', signed=True)
+
+
+def diff_entry(record, base):
+    """Delta entry holding the fields of record that differ from its base record."""
+    entry = {'id': record['id'], 'retrieved_utc': record.get('retrieved_utc')}
+    entry[DIFF_KEY] = {key: value for key, value in record.items() if key not in VOLATILE_FIELDS and base.get(key, _MISSING) != value}
+    removed = [key for key in base if key not in record and key not in VOLATILE_FIELDS]
+    if removed:
+        entry[REMOVED_KEY] = removed
+    return entry
+
+
+def unchanged_entry(record):
+    return {'id': record['id'], 'retrieved_utc': record.get('retrieved_utc'), UNCHANGED_KEY: True}
+
+
+def apply_entry(base, entry):
+    """Return the record a full or diff delta entry stands for, given the base record ({} if not in the base)."""
+    if DIFF_KEY not in entry:
+        return entry
+    record = dict(base)
+    record.update(entry[DIFF_KEY])
+    for key in entry.get(REMOVED_KEY, ()):
+        record.pop(key, None)
+    # retrieved_utc goes last, like the serializers write it
+    record.pop('retrieved_utc', None)
+    record['retrieved_utc'] = entry['retrieved_utc']
+    return record
+
+
+def read_deltas(deltas):
+    """Return the latest full or diff entry of each ID, and the retrieval time of IDs found unchanged after it."""
+    latest, touched = {}, {}
+    for delta in deltas:
+        for line in iter_lines(delta):
+            entry = loads(line)
+            if entry.get(UNCHANGED_KEY):
+                touched[entry['id']] = entry['retrieved_utc']
+            else:
+                latest[entry['id']] = entry
+                touched.pop(entry['id'], None)
+    return latest, touched
+
+
+def iter_view(outfile, deltas=None):
+    """Yield the records of a split file's view: its base with the latest delta entries applied.
+
+    Entries of the deltas are held in memory; the base is streamed. deltas defaults to all delta
+    files of the base.
+    """
+    latest, touched = read_deltas(delta_files(outfile) if deltas is None else deltas)
+    if os.path.exists(outfile):
+        for line in iter_lines(outfile):
+            record = loads(line)
+            id_ = record['id']
+            entry = latest.pop(id_, None)
+            if entry is not None:
+                record = apply_entry(record, entry)
+            if id_ in touched:
+                record['retrieved_utc'] = touched.pop(id_)
+            yield record
+    # IDs that are not in the base only have full entries
+    for id_, entry in latest.items():
+        record = apply_entry({}, entry)
+        if id_ in touched:
+            record['retrieved_utc'] = touched[id_]
+        yield record
+
+
+def view_sources(files):
+    return [[os.path.basename(f), os.path.getsize(f)] for f in files if os.path.exists(f)]
+
+
+class HashIndex:
+    """Content hash of every ID in a split file's view, as sorted int64 arrays (16 bytes per ID).
+
+    Stored next to the base as {base}.hashes.npz along with the files (and their sizes) it was built
+    from, so it is only rebuilt from the view when those changed.
+    """
+
+    def __init__(self, ids=None, hashes=None, sources=()):
+        ids = np.zeros(0, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        hashes = np.zeros(0, dtype=np.int64) if hashes is None else np.asarray(hashes, dtype=np.int64)
+        order = np.argsort(ids, kind='stable')
+        self.ids, self.hashes = ids[order], hashes[order]
+        self.sources = [list(source) for source in sources]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, outfile, deltas):
+        ids, hashes = [], []
+        for record in iter_view(outfile, deltas):
+            ids.append(b36decode(record['id']))
+            hashes.append(content_hash(record))
+        return cls(ids, hashes, view_sources([outfile] + deltas))
+
+    @classmethod
+    def load(cls, outfile, deltas, scrape_logger=None):
+        """Load the stored index of a base and its deltas, rebuilding it if it does not match them."""
+        sources = view_sources([outfile] + deltas)
+        filename = hashes_path(outfile)
+        if os.path.exists(filename):
+            with np.load(filename) as data:
+                if json.loads(str(data['sources'])) == sources:
+                    return cls(data['ids'], data['hashes'], sources)
+        if scrape_logger is not None:
+            scrape_logger.info(f"Building the content hash index of {outfile}")
+        return cls.build(outfile, deltas)
+
+    def lookup(self, values):
+        """Return (found, hashes) arrays for an int64 array of IDs."""
+        positions = np.searchsorted(self.ids, values)
+        positions = np.minimum(positions, max(len(self.ids) - 1, 0))
+        if not len(self.ids):
+            return np.zeros(len(values), dtype=bool), np.zeros(len(values), dtype=np.int64)
+        return self.ids[positions] == values, self.hashes[positions]
+
+    def unchanged(self, ids, hashes):
+        """Return for each base36 ID whether its content hash is the one stored for it."""
+        found, previous = self.lookup(np.array([b36decode(id_) for id_ in ids], dtype=np.int64))
+        return (found & (previous == np.array(hashes, dtype=np.int64))).tolist()
+
+    def updated(self, ids, hashes, sources):
+        """Return a new index with the hashes of ids replaced or added."""
+        ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        hashes = np.concatenate([self.hashes, np.asarray(hashes, dtype=np.int64)])
+        # The last occurrence of each ID wins
+        _, last = np.unique(ids[::-1], return_index=True)
+        keep = len(ids) - 1 - last
+        return HashIndex(ids[keep], hashes[keep], sources)
+
+    def save(self, outfile):
+        # Written to a temporary file and renamed so a crash never leaves a partial index
+        filename = hashes_path(outfile)
+        tmp_file = filename + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, ids=self.ids, hashes=self.hashes, sources=np.array(json.dumps(self.sources)))
+        os.replace(tmp_file, filename)
+
+
+def compact(outfile, output_file=None, level=3):
+    """Write the view of a base snapshot and its deltas as a full snapshot. Returns the number of records.
+
+    Without output_file, the view replaces the base and the deltas are removed, along with the
+    indexes that pointed into them. If the base had a frame index, one is built for the snapshot.
+    """
+    target = output_file or outfile
+    tmp_file = target + '.compact'
+    deltas = delta_files(outfile)
+    indexed = os.path.exists(index_path(outfile))
+    ids, hashes = [], []
+    with open(tmp_file, 'wb') as f:
+        writer = zstd.ZstdCompressor(level=level).stream_writer(f)
+        lines = []
+        for record in iter_view(outfile, deltas):
+            ids.append(b36decode(record['id']))
+            hashes.append(content_hash(record))
+            lines.append(dumps(record) + b'\n')
+            if len(lines) == LINES_PER_FRAME:
+                writer.write(b''.join(lines))
+                writer.flush(zstd.FLUSH_FRAME)
+                lines = []
+        if lines:
+            writer.write(b''.join(lines))
+            writer.flush(zstd.FLUSH_FRAME)
+        writer.close()
+    os.replace(tmp_file, target)
+
+    if output_file is None:
+        for previous_file in deltas + [index_path(delta) for delta in deltas]:
+            if os.path.exists(previous_file):
+                os.remove(previous_file)
+    if indexed:
+        build_index(target)
+    elif os.path.exists(index_path(target)):
+        os.remove(index_path(target))  # Points into the frames that were replaced
+    HashIndex(ids, hashes, view_sources([target])).save(target)
+    return len(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compact delta output: merge each base snapshot with its deltas back into a full .ndjson.zst snapshot')
+    parser.add_argument('--dataset', type=str, required=True, help='Dataset to compact')
+    parser.add_argument('--datatype', type=str, choices=['submissions', 'comments'], default='submissions', help='Type of data to compact')
+    parser.add_argument('--basefolder', type=str, default='', help='Base folder of the data')
+    parser.add_argument('--split', type=str, default=None, help='Only compact this split file (name without extension)')
+    parser.add_argument('--output_folder', type=str, default=None, help='Write the full snapshots here and leave the base and deltas as they are')
+    args = parser.parse_args()
+
+    folder = os.path.join(args.basefolder, f'data/{args.datatype}_{args.dataset}')
+    outfiles = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(OUTPUT_EXTENSION))
+    if args.split:
+        outfiles = [outfile for outfile in outfiles if os.path.basename(outfile) == args.split + OUTPUT_EXTENSION]
+    if args.output_folder:
+        os.makedirs(args.output_folder, exist_ok=True)
+
+    for outfile in outfiles:
+        deltas = delta_files(outfile)
+        if not deltas and not args.output_folder:
+            continue
+        output_file = os.path.join(args.output_folder, os.path.basename(outfile)) if args.output_folder else None
+        records = compact(outfile, output_file)
+        print(f"Compacted {os.path.basename(outfile)} and {len(deltas)} deltas ({records} records)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import json
+import mmap
+import os
+import struct
+
+from reddit_ids import b36decode
+from zstd_dict import FrameDecompressors, iter_frames
+
+# Sidecar index of a .ndjson.zst file written one zstd frame per batch. Each entry maps a record ID to
+# the compressed frame holding it and to the record's position inside the decompressed frame.
+MAGIC = b'RSIDX\x01'
+HEADER = struct.Struct('<6s?x')
+# id, frame offset, frame size, line offset in frame, line length
+ENTRY = struct.Struct('<qQIII')
+
+
+def index_path(outfile):
+    return outfile + '.idx'
+
+
+class FrameIndexWriter:
+    """Appends index entries while the output is being written. Entries are sorted by finalize()."""
+
+    def __init__(self, index_file, truncate_to=None):
+        self.index_file = index_file
+        if truncate_to is not None and os.path.exists(index_file):
+            self.f = open(index_file, 'r+b')
+            self.f.truncate(truncate_to)
+            # Appending breaks the sort order
+            self.f.seek(0)
+            self.f.write(HEADER.pack(MAGIC, False))
+            self.f.seek(0, os.SEEK_END)
+        else:
+            self.f = open(index_file, 'wb')
+            self.f.write(HEADER.pack(MAGIC, False))
+
+    def add_frame(self, frame_offset, frame_size, ids, line_lengths):
+        line_offset = 0
+        entries = []
+        for id_, line_length in zip(ids, line_lengths):
+            entries.append(ENTRY.pack(b36decode(id_), frame_offset, frame_size, line_offset, line_length))
+            line_offset += line_length
+        self.f.write(b''.join(entries))
+
+    def flush(self):
+        self.f.flush()
+
+    def tell(self):
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+    def finalize(self):
+        """Rewrite the index sorted by ID so lookups can binary search it without loading it."""
+        self.f.close()
+        entries = sorted(read_entries(self.index_file))
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, True))
+            f.write(b''.join(ENTRY.pack(*entry) for entry in entries))
+        os.replace(tmp_file, self.index_file)
+
+
+def read_entries(index_file):
+    with open(index_file, 'rb') as f:
+        magic, _ = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{index_file} is not a frame index")
+        data = f.read()
+    return list(ENTRY.iter_unpack(data[:len(data) - len(data) % ENTRY.size]))
+
+
+def build_index(outfile, index_file=None):
+    """Build a sorted index for an existing output file by scanning its frames."""
+    index_file = index_file or index_path(outfile)
+    writer = FrameIndexWriter(index_file)
+    with open(outfile, 'rb') as f:
+        for frame_offset, frame_size, data in iter_frames(f, decompressors=FrameDecompressors.for_file(outfile)):
+            lines = data.splitlines(keepends=True)
+            writer.add_frame(frame_offset, frame_size, [json.loads(line)['id'] for line in lines], [len(line) for line in lines])
+    writer.finalize()
+    return index_file
+
+
+class FrameIndex:
+    """Looks up records of one output file by ID through its sidecar index."""
+
+    def __init__(self, outfile, index_file=None):
+        self.outfile = outfile
+        self.index_file = index_file or index_path(outfile)
+        self._decompressors = FrameDecompressors.for_file(outfile)
+
+        with open(self.index_file, 'rb') as f:
+            magic, self.is_sorted = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{self.index_file} is not a frame index")
+
+        if self.is_sorted:
+            with open(self.index_file, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(self.index_file) > HEADER.size else b''
+            self._count = (len(self._mmap) - HEADER.size) // ENTRY.size if self._mmap else 0
+        else:
+            # Index of an unfinished file: entries are in write order, the last one for an ID wins
+            self._entries = {entry[0]: entry for entry in read_entries(self.index_file)}
+
+    def find(self, id_):
+        """Return the index entry for id_ (base36, without prefix), or None."""
+        value = b36decode(id_)
+        if not self.is_sorted:
+            return self._entries.get(value)
+
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if struct.unpack_from('<q', self._mmap, HEADER.size + mid * ENTRY.size)[0] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count:
+            entry = ENTRY.unpack_from(self._mmap, HEADER.size + lo * ENTRY.size)
+            if entry[0] == value:
+                return entry
+        return None
+
+    def _read_frame(self, f, frame_offset, frame_size):
+        f.seek(frame_offset)
+        return self._decompressors.decompress(f.read(frame_size))
+
+    def get_many(self, ids):
+        """Return {id: record line} for the IDs found in this file, decompressing each frame once."""
+        by_frame = {}
+        for id_ in ids:
+            entry = self.find(id_)
+            if entry is not None:
+                by_frame.setdefault((entry[1], entry[2]), []).append((id_, entry[3], entry[4]))
+
+        records = {}
+        with open(self.outfile, 'rb') as f:
+            for (frame_offset, frame_size), wanted in sorted(by_frame.items()):
+                data = self._read_frame(f, frame_offset, frame_size)
+                for id_, line_offset, line_length in wanted:
+                    records[id_] = data[line_offset:line_offset + line_length]
+        return records
+
+    def get(self, id_):
+        return self.get_many([id_]).get(id_)
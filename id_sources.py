@@ -0,0 +1,205 @@
+import argparse
+import os
+from itertools import islice
+
+import zstandard as zstd
+
+from reddit_ids import b36decode, b36encode
+from split_ids import read_id_array
+
+# A split file is either a list of IDs (.txt, .txt.zst), one per line, or a list of ID ranges (.ranges),
+# one "start,end" pair of base36 IDs per line covering [start, end).
+SPLIT_FILE_SUFFIXES = ('.txt', '.txt.zst', '.ranges')
+
+
+class TextIdSource:
+    """IDs listed one per line in a (possibly zstd-compressed) text file."""
+
+    def __init__(self, split_file):
+        self.split_file = split_file
+
+    def _open(self):
+        if self.split_file.endswith('.zst'):
+            return zstd.open(self.split_file, 'rt')
+        return open(self.split_file)
+
+    def __len__(self):
+        with self._open() as f:
+            return sum(1 for _ in f)
+
+    def batches(self, batch_size):
+        with self._open() as f:
+            while True:
+                batch_ids = [line.strip() for line in islice(f, batch_size)]
+                if not batch_ids:
+                    break
+                yield batch_ids
+
+
+class RangeIdSource:
+    """IDs enumerated on the fly from [start, end) runs of decoded base36 IDs."""
+
+    def __init__(self, runs):
+        self.runs = [(start, end) for start, end in runs if end > start]
+
+    @classmethod
+    def from_file(cls, split_file):
+        runs = []
+        with open(split_file) as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                start, end = line.split(',')
+                runs.append((b36decode(start), b36decode(end)))
+        return cls(runs)
+
+    def __len__(self):
+        return sum(end - start for start, end in self.runs)
+
+    def batches(self, batch_size):
+        batch_ids = []
+        for start, end in self.runs:
+            for value in range(start, end):
+                batch_ids.append(b36encode(value))
+                if len(batch_ids) == batch_size:
+                    yield batch_ids
+                    batch_ids = []
+        if batch_ids:
+            yield batch_ids
+
+
+class ListIdSource:
+    """IDs held in memory, e.g. the failed IDs of a split file, without duplicates."""
+
+    def __init__(self, ids):
+        self.ids = list(dict.fromkeys(id_ for id_ in ids if id_))
+
+    @classmethod
+    def from_file(cls, filename):
+        with open(filename) as f:
+            return cls(line.strip() for line in f)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def batches(self, batch_size):
+        for i in range(0, len(self.ids), batch_size):
+            yield self.ids[i:i+batch_size]
+
+
+def open_id_source(split_file):
+    if split_file.endswith('.ranges'):
+        return RangeIdSource.from_file(split_file)
+    return TextIdSource(split_file)
+
+
+def find_split_file(split_folder, name):
+    """Return the split file called name with whichever supported suffix exists (.txt if none does)."""
+    for suffix in SPLIT_FILE_SUFFIXES:
+        split_file = os.path.join(split_folder, name + suffix)
+        if os.path.exists(split_file):
+            return split_file
+    return os.path.join(split_folder, name + '.txt')
+
+
+def is_split_file(filename):
+    return filename.endswith(SPLIT_FILE_SUFFIXES)
+
+
+def values_to_runs(values):
+    """Collapse sorted, unique decoded IDs into [start, end) runs."""
+    runs = []
+    for value in values:
+        if runs and runs[-1][1] == value:
+            runs[-1][1] = value + 1
+        else:
+            runs.append([value, value + 1])
+    return [tuple(run) for run in runs]
+
+
+def subtract_values(runs, excluded):
+    """Remove the sorted decoded IDs in excluded from the runs."""
+    result = []
+    excluded = iter(excluded)
+    next_excluded = next(excluded, None)
+    for start, end in runs:
+        while next_excluded is not None and next_excluded < end:
+            if next_excluded >= start:
+                if next_excluded > start:
+                    result.append((start, next_excluded))
+                start = next_excluded + 1
+            next_excluded = next(excluded, None)
+        if end > start:
+            result.append((start, end))
+    return result
+
+
+def split_runs(runs, split_size):
+    """Cut runs into consecutive groups holding split_size IDs each (the last one may hold fewer)."""
+    group, count = [], 0
+    for start, end in runs:
+        while start < end:
+            take = min(end - start, split_size - count)
+            group.append((start, start + take))
+            count += take
+            start += take
+            if count == split_size:
+                yield group
+                group, count = [], 0
+    if group:
+        yield group
+
+
+def write_range_splits(runs, split_size, batch_dir, base_name):
+    """Write runs as numbered .ranges split files of split_size IDs each and return their paths."""
+    os.makedirs(batch_dir, exist_ok=True)
+    split_files = []
+    for i, group in enumerate(split_runs(runs, split_size)):
+        split_file = os.path.join(batch_dir, f"{base_name}_{i + 1:03}.ranges")
+        with open(split_file, 'w') as f:
+            for start, end in group:
+                f.write(f"{b36encode(start)},{b36encode(end)}\n")
+        split_files.append(split_file)
+    return split_files
+
+
+def merge_runs(runs):
+    """Sort runs and merge the ones that overlap or touch."""
+    merged = []
+    for start, end in sorted(runs):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(run) for run in merged]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write .ranges split files for scrape_submissions from base36 ID ranges or ID lists.")
+    parser.add_argument('--name', type=str, required=True, help='Name of the split files, e.g. submission_ids_DATASET')
+    parser.add_argument('--range', type=str, action='append', default=[], help='Base36 range "start,end" (end exclusive); may be repeated')
+    parser.add_argument('--from_ids', type=str, help='CSV file of IDs to store as range runs instead of a range')
+    parser.add_argument('--exclude', type=str, help='Optional CSV file of IDs to leave out')
+    parser.add_argument('--batch_size', type=int, default=1000000, help='Number of IDs per split file (default: 1,000,000)')
+    parser.add_argument('--basefolder', type=str, default='', help='Base folder for data writing')
+    args = parser.parse_args()
+
+    runs = []
+    for id_range in args.range:
+        start, end = id_range.split(',')
+        runs.append((b36decode(start), b36decode(end)))
+    if args.from_ids:
+        runs.extend(values_to_runs(read_id_array(args.from_ids).tolist()))
+    runs = merge_runs(runs)
+
+    if args.exclude:
+        runs = subtract_values(runs, read_id_array(args.exclude).tolist())
+
+    batch_dir = os.path.join(args.basefolder, 'data/ids/batched', args.name)
+    split_files = write_range_splits(runs, args.batch_size, batch_dir, args.name)
+    print(f"Wrote {len(split_files)} split files with {sum(end - start for start, end in runs)} IDs to {batch_dir}")
+
+
+if __name__ == "__main__":
+    main()
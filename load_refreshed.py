@@ -0,0 +1,264 @@
+import argparse
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import psycopg
+from psycopg import sql
+
+from delta_output import delta_files, iter_view
+from serializers import dumps, loads
+from zstd_dict import iter_lines
+
+TABLES = {
+    'submissions': 'reddit.submissions_refresh',
+    'comments': 'reddit.comments_refresh',
+}
+MANIFEST_TABLE = 'reddit.refresh_manifest'
+OUTPUT_EXTENSION = '.ndjson.zst'
+# Rows per write to the COPY stream
+COPY_BLOCK_SIZE = 10000
+# Postgres text cannot hold NUL characters, so jsonb rejects the escape; it is dropped from the records
+# (an escaped backslash followed by "u0000" is left alone)
+NUL_ESCAPE = re.compile(rb'(?<!\\)((?:\\\\)*)\\u0000')
+
+
+def table_identifier(table_name: str) -> sql.Identifier:
+    return sql.Identifier(*table_name.split('.'))
+
+
+def staging_identifier(table_name: str) -> sql.Identifier:
+    return table_identifier(table_name + '_staging')
+
+
+def create_tables(conn: psycopg.Connection, table_name: str):
+    """
+    Creates the refresh table (one row per ID, keyed on id), its unlogged staging table and the
+    manifest of loaded output files if they do not exist yet.
+    """
+    refresh = table_identifier(table_name)
+    staging = staging_identifier(table_name)
+    conn.execute(sql.SQL(
+        "CREATE TABLE IF NOT EXISTS {} ("
+        "id text PRIMARY KEY, dataset text NOT NULL, retrieved_utc bigint, data jsonb NOT NULL)"
+    ).format(refresh))
+    conn.execute(sql.SQL(
+        "CREATE UNLOGGED TABLE IF NOT EXISTS {} ("
+        "id text NOT NULL, dataset text NOT NULL, split_file text NOT NULL, retrieved_utc bigint, data text NOT NULL)"
+    ).format(staging))
+    conn.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} (dataset, split_file)").format(
+        sql.Identifier(table_name.split('.')[-1] + '_staging_split_file_idx'), staging,
+    ))
+    conn.execute(sql.SQL(
+        "CREATE TABLE IF NOT EXISTS {} ("
+        "table_name text NOT NULL, dataset text NOT NULL, split_file text NOT NULL, output_bytes bigint NOT NULL, "
+        "records bigint NOT NULL, status text NOT NULL, loaded_at timestamptz NOT NULL DEFAULT now(), "
+        "PRIMARY KEY (table_name, dataset, split_file))"
+    ).format(table_identifier(MANIFEST_TABLE)))
+
+
+def read_manifest(conn: psycopg.Connection, table_name: str, dataset: str) -> dict:
+    """
+    Returns {split file: (output bytes, status)} of the output files of a dataset already in the
+    manifest. Status is 'staged' until the file has been merged into the refresh table, then 'merged'.
+    """
+    rows = conn.execute(
+        sql.SQL("SELECT split_file, output_bytes, status FROM {} WHERE table_name = %s AND dataset = %s").format(
+            table_identifier(MANIFEST_TABLE)
+        ),
+        (table_name, dataset),
+    ).fetchall()
+    return {split_file: (output_bytes, status) for split_file, output_bytes, status in rows}
+
+
+def csv_quote(value: bytes) -> bytes:
+    return b'"' + value.replace(b'"', b'""') + b'"'
+
+
+def csv_row(id_: str, dataset: str, split_file: str, retrieved_utc, line: bytes) -> bytes:
+    # An unquoted empty field is NULL in CSV
+    retrieved = b'' if retrieved_utc is None else str(retrieved_utc).encode()
+    fields = (csv_quote(id_.encode()), csv_quote(dataset.encode()), csv_quote(split_file.encode()), retrieved, csv_quote(line))
+    return b','.join(fields) + b'\n'
+
+
+def output_size(outfile: str) -> int:
+    return sum(os.path.getsize(f) for f in [outfile] + delta_files(outfile))
+
+
+def iter_view_lines(outfile: str):
+    """
+    Yields the ndjson lines of an output file; delta output (see delta_output.py) is read as its
+    base with the deltas applied.
+    """
+    if not delta_files(outfile):
+        yield from iter_lines(outfile)
+        return
+    for record in iter_view(outfile):
+        yield dumps(record) + b'\n'
+
+
+def iter_rows(outfile: str):
+    """
+    Yields (id, retrieved_utc, ndjson line) for each record of an output file.
+    """
+    for line in iter_view_lines(outfile):
+        line = line.rstrip(b'\n')
+        if not line:
+            continue
+        if b'\\u0000' in line:
+            line = NUL_ESCAPE.sub(rb'\1', line)
+        record = loads(line)
+        yield record['id'], record.get('retrieved_utc'), line
+
+
+def stage_file(
+    conninfo: str,
+    table_name: str,
+    dataset: str,
+    outfile: str,
+    copy_format: str = 'csv',
+) -> int:
+    """
+    Streams one output file into the staging table with COPY FROM STDIN and records it in the
+    manifest as staged, in a single transaction. Rows a previous attempt left for the same split
+    file are replaced, so a crashed or repeated load never duplicates them. Returns the number of
+    records loaded.
+    """
+    split_file = os.path.basename(outfile)[:-len(OUTPUT_EXTENSION)]
+    output_bytes = output_size(outfile)
+    staging = staging_identifier(table_name)
+    columns = sql.SQL("(id, dataset, split_file, retrieved_utc, data)")
+    records = 0
+
+    with psycopg.connect(conninfo) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("DELETE FROM {} WHERE dataset = %s AND split_file = %s").format(staging), (dataset, split_file))
+
+            if copy_format == 'binary':
+                with cur.copy(sql.SQL("COPY {} {} FROM STDIN (FORMAT BINARY)").format(staging, columns)) as copy:
+                    copy.set_types(['text', 'text', 'text', 'int8', 'text'])
+                    for id_, retrieved_utc, line in iter_rows(outfile):
+                        copy.write_row((id_, dataset, split_file, retrieved_utc, line.decode('utf-8')))
+                        records += 1
+            else:
+                with cur.copy(sql.SQL("COPY {} {} FROM STDIN (FORMAT CSV)").format(staging, columns)) as copy:
+                    block = []
+                    for id_, retrieved_utc, line in iter_rows(outfile):
+                        block.append(csv_row(id_, dataset, split_file, retrieved_utc, line))
+                        if len(block) == COPY_BLOCK_SIZE:
+                            copy.write(b''.join(block))
+                            records += len(block)
+                            block = []
+                    copy.write(b''.join(block))
+                    records += len(block)
+
+            cur.execute(
+                sql.SQL(
+                    "INSERT INTO {} (table_name, dataset, split_file, output_bytes, records, status) "
+                    "VALUES (%s, %s, %s, %s, %s, 'staged') "
+                    "ON CONFLICT (table_name, dataset, split_file) DO UPDATE SET output_bytes = EXCLUDED.output_bytes, "
+                    "records = EXCLUDED.records, status = 'staged', loaded_at = now()"
+                ).format(table_identifier(MANIFEST_TABLE)),
+                (table_name, dataset, split_file, output_bytes, records),
+            )
+    return records
+
+
+def merge_staged(conn: psycopg.Connection, table_name: str, dataset: str) -> int:
+    """
+    Upserts everything staged for a dataset into the refresh table in one statement, keeping the
+    most recently retrieved version of each ID, then marks the staged files as merged and empties
+    their staging rows. Runs as one transaction. Returns the number of rows inserted or updated.
+    """
+    refresh = table_identifier(table_name)
+    staging = staging_identifier(table_name)
+    with conn.transaction():
+        cur = conn.execute(
+            sql.SQL(
+                "INSERT INTO {refresh} AS r (id, dataset, retrieved_utc, data) "
+                "SELECT DISTINCT ON (id) id, dataset, retrieved_utc, data::jsonb FROM {staging} WHERE dataset = %s "
+                "ORDER BY id, retrieved_utc DESC NULLS LAST "
+                "ON CONFLICT (id) DO UPDATE SET dataset = EXCLUDED.dataset, retrieved_utc = EXCLUDED.retrieved_utc, data = EXCLUDED.data "
+                "WHERE r.retrieved_utc IS NULL OR EXCLUDED.retrieved_utc >= r.retrieved_utc"
+            ).format(refresh=refresh, staging=staging),
+            (dataset,),
+        )
+        merged = cur.rowcount
+        conn.execute(
+            sql.SQL("UPDATE {} SET status = 'merged' WHERE table_name = %s AND dataset = %s AND status = 'staged'").format(
+                table_identifier(MANIFEST_TABLE)
+            ),
+            (table_name, dataset),
+        )
+        conn.execute(sql.SQL("DELETE FROM {} WHERE dataset = %s").format(staging), (dataset,))
+    return merged
+
+
+def output_files(base_folder: str, datatype: str, dataset: str) -> list:
+    folder = os.path.join(base_folder, f'data/{datatype}_{dataset}')
+    if not os.path.isdir(folder):
+        return []
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(OUTPUT_EXTENSION))
+
+
+def load_dataset(
+    conninfo: str,
+    base_folder: str,
+    datatype: str,
+    dataset: str,
+    workers: int = 4,
+    copy_format: str = 'csv',
+    reload: bool = False,
+):
+    """
+    Stages the output files of a dataset that the manifest does not already hold at their current
+    size (deltas included), with one worker process per file, then merges the staged files into the refresh table.
+    """
+    table_name = TABLES[datatype]
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        create_tables(conn, table_name)
+        manifest = {} if reload else read_manifest(conn, table_name, dataset)
+
+    pending = [
+        outfile for outfile in output_files(base_folder, datatype, dataset)
+        if manifest.get(os.path.basename(outfile)[:-len(OUTPUT_EXTENSION)], (None,))[0] != output_size(outfile)
+    ]
+    print(f"{datatype}_{dataset}: {len(pending)} output files to load")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(stage_file, conninfo, table_name, dataset, outfile, copy_format): outfile
+            for outfile in pending
+        }
+        for future in as_completed(futures):
+            print(f"Staged: {os.path.basename(futures[future])} ({future.result()} records)")
+
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        merged = merge_staged(conn, table_name, dataset)
+    print(f"Merged: {datatype}_{dataset} into {table_name} ({merged} rows)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load scraped .ndjson.zst output back into Postgres refresh tables')
+    parser.add_argument('datasets', type=str, help='Comma-separated datasets to load')
+    parser.add_argument('--datatype', type=str, choices=['submissions', 'comments', 'both'], default='submissions', help='Type of data to load')
+    parser.add_argument('--basefolder', type=str, default='', help='Base folder of the data')
+    parser.add_argument('--host', type=str, default='localhost', help='Database host')
+    parser.add_argument('--port', type=str, default='5432', help='Database port')
+    parser.add_argument('--dbname', type=str, default='datasets', help='Database name')
+    parser.add_argument('--user', type=str, default='postgres', help='Database user')
+    parser.add_argument('--workers', type=int, default=4, help='Number of output files (and connections) loaded in parallel')
+    parser.add_argument('--copy_format', type=str, choices=['csv', 'binary'], default='csv', help='COPY format used to stream rows into the staging table')
+    parser.add_argument('--reload', action='store_true', help='Load every output file again, even those the manifest holds at their current size')
+    args = parser.parse_args()
+
+    conninfo = f"host={args.host} port={args.port} dbname={args.dbname} user={args.user}"
+    datatypes = ['submissions', 'comments'] if args.datatype == 'both' else [args.datatype]
+    for dataset in args.datasets.split(','):
+        for datatype in datatypes:
+            load_dataset(conninfo, args.basefolder, datatype, dataset, args.workers, args.copy_format, args.reload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import os
+import sys
+
+from delta_output import DIFF_KEY, UNCHANGED_KEY, apply_entry, delta_files, iter_view
+from frame_index import FrameIndex, build_index, index_path
+from serializers import dumps, loads
+
+
+def find_output_files(base_folder, datatype, dataset):
+    """List the .ndjson.zst output files of a dataset."""
+    output_folder = os.path.join(base_folder, f'data/{datatype}_{dataset}')
+    return sorted(os.path.join(output_folder, f) for f in os.listdir(output_folder) if f.endswith('.ndjson.zst'))
+
+
+def lookup_view(outfile, deltas, ids):
+    """Return {id: ndjson line} for the IDs found in the view of a base and its deltas, through their indexes."""
+    # Newest delta first: the first full or diff entry of an ID is its latest, unchanged entries seen
+    # before it only move its retrieved_utc
+    latest, touched = {}, {}
+    remaining = list(ids)
+    for delta in reversed(deltas):
+        if not remaining:
+            break
+        for id_, line in FrameIndex(delta).get_many(remaining).items():
+            entry = loads(line)
+            if entry.get(UNCHANGED_KEY):
+                touched.setdefault(id_, entry['retrieved_utc'])
+            else:
+                latest[id_] = entry
+        remaining = [id_ for id_ in remaining if id_ not in latest]
+
+    base_lines = FrameIndex(outfile).get_many([id_ for id_ in ids if id_ not in latest or DIFF_KEY in latest[id_]])
+    records = {}
+    for id_ in ids:
+        if id_ in latest:
+            record = apply_entry(loads(base_lines[id_]) if id_ in base_lines else {}, latest[id_])
+        elif id_ in base_lines:
+            if id_ not in touched:
+                records[id_] = base_lines[id_]
+                continue
+            record = loads(base_lines[id_])
+        else:
+            continue
+        if id_ in touched:
+            record['retrieved_utc'] = touched[id_]
+        records[id_] = dumps(record) + b'\n'
+    return records
+
+
+def scan_view(outfile, deltas, ids):
+    """Return {id: ndjson line} for the IDs found in the view of a base and its deltas, reading all of it."""
+    wanted = set(ids)
+    return {record['id']: dumps(record) + b'\n' for record in iter_view(outfile, deltas) if record['id'] in wanted}
+
+
+def lookup_ids(ids, output_files):
+    """Return {id: ndjson line} for the IDs found in the output files, with their latest delta entries
+    applied, and the output files that were skipped for lack of an index.
+
+    Plain output files are only looked up through their index. Delta output with an index for the
+    base and every delta is too; without, its view is read in full.
+    """
+    records = {}
+    skipped = []
+    for outfile in output_files:
+        remaining = [id_ for id_ in ids if id_ not in records]
+        if not remaining:
+            break
+        deltas = delta_files(outfile)
+        if all(os.path.exists(index_path(f)) for f in [outfile] + deltas):
+            records.update(lookup_view(outfile, deltas, remaining))
+        elif deltas:
+            records.update(scan_view(outfile, deltas, remaining))
+        else:
+            skipped.append(outfile)
+    return records, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up scraped records by ID in indexed .ndjson.zst output (and its deltas).")
+    parser.add_argument('--dataset', type=str, required=True, help='Dataset to look up records in')
+    parser.add_argument('--datatype', type=str, choices=['submissions', 'comments'], default='submissions', help='Type of data to look up')
+    parser.add_argument('--basefolder', type=str, default='', help='Base folder of the data')
+    parser.add_argument('--ids', type=str, help='Comma-separated IDs (without t1_/t3_ prefix)')
+    parser.add_argument('--ids_file', type=str, help='File with one ID per line')
+    parser.add_argument('--build_index', action='store_true', help='Build missing indexes by scanning the output files first')
+    args = parser.parse_args()
+
+    ids = []
+    if args.ids:
+        ids.extend(id_.strip() for id_ in args.ids.split(','))
+    if args.ids_file:
+        with open(args.ids_file) as f:
+            ids.extend(line.strip() for line in f)
+    ids = [id_.split('_', 1)[-1] for id_ in ids if id_]
+
+    output_files = find_output_files(args.basefolder, args.datatype, args.dataset)
+    if args.build_index:
+        for outfile in output_files:
+            for f in [outfile] + delta_files(outfile):
+                if not os.path.exists(index_path(f)):
+                    build_index(f)
+
+    records, skipped = lookup_ids(ids, output_files)
+    for id_ in ids:
+        if id_ in records:
+            sys.stdout.buffer.write(records[id_])
+        else:
+            print(f"Not found: {id_}", file=sys.stderr)
+    if skipped:
+        print(f"Skipped {len(skipped)} output files without an index, run with --build_index to search them too", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+COUNTERS = (
+    'info_calls',         # info calls made, retries and rate-limited calls included
+    'rate_limited',       # info calls answered with a 429
+    'retries',            # info calls retried after an error
+    'bisections',         # batches split in half after failing repeatedly
+    'requested_ids',      # IDs sent in the batches
+    'returned_ids',       # items returned for them (the rest are deleted or missing)
+    'failed_ids',         # IDs given up on and written to the failed IDs file
+    'records',            # ndjson lines written
+    'unchanged_records',  # records delta output stamped as unchanged instead of writing them (split file summaries only)
+    'output_bytes',       # compressed bytes written
+)
+
+# acquire: waiting for an account with quota, fetch: whole batches including retries
+STAGES = ('acquire', 'fetch', 'serialize', 'write')
+
+PROMETHEUS_PREFIX = 'refresh_shift'
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Return (upper bound, count of observations <= bound) pairs, ending with +Inf."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (None if empty)."""
+        if not self.count:
+            return None
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return bound
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': {str(bound): total for bound, total in self.cumulative()},
+        }
+
+
+class Metrics:
+    """Counters, latency histograms and time per pipeline stage of a scrape run or split file.
+
+    'info' latency covers single API calls and is recorded by the account pool, 'fetch' latency
+    covers whole info batches including retries and is recorded by the pipeline.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.latency = {'info': Histogram(), 'fetch': Histogram()}
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def add_stage_time(self, stage, seconds):
+        self.stage_seconds[stage] += seconds
+
+    def observe_latency(self, name, seconds):
+        self.latency[name].observe(seconds)
+
+    def summary(self):
+        elapsed = time.time() - self.started
+        counters = self.counters
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            **counters,
+            'returned_ratio': counters['returned_ids'] / counters['requested_ids'] if counters['requested_ids'] else None,
+            'records_per_second': counters['records'] / elapsed if elapsed else None,
+            'bytes_per_second': counters['output_bytes'] / elapsed if elapsed else None,
+            'stage_seconds': {stage: round(seconds, 3) for stage, seconds in self.stage_seconds.items()},
+            'latency': {name: histogram.summary() for name, histogram in self.latency.items()},
+        }
+
+    def to_prometheus(self, labels=None):
+        """Render the metrics in the Prometheus text exposition format."""
+        def format_labels(extra=None):
+            pairs = {**(labels or {}), **(extra or {})}
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{key}="{value}"' for key, value in pairs.items()) + '}'
+
+        lines = []
+        for name, value in self.counters.items():
+            metric = f'{PROMETHEUS_PREFIX}_{name}_total'
+            lines += [f'# TYPE {metric} counter', f'{metric}{format_labels()} {value}']
+
+        metric = f'{PROMETHEUS_PREFIX}_stage_seconds_total'
+        lines.append(f'# TYPE {metric} counter')
+        for stage, seconds in self.stage_seconds.items():
+            lines.append(f'{metric}{format_labels({"stage": stage})} {seconds:.6f}')
+
+        for name, histogram in self.latency.items():
+            metric = f'{PROMETHEUS_PREFIX}_{name}_latency_seconds'
+            lines.append(f'# TYPE {metric} histogram')
+            for bound, total in histogram.cumulative():
+                le = '+Inf' if bound == float('inf') else str(bound)
+                lines.append(f'{metric}_bucket{format_labels({"le": le})} {total}')
+            lines += [f'{metric}_sum{format_labels()} {histogram.sum:.6f}', f'{metric}_count{format_labels()} {histogram.count}']
+
+        metric = f'{PROMETHEUS_PREFIX}_elapsed_seconds'
+        lines += [f'# TYPE {metric} gauge', f'{metric}{format_labels()} {time.time() - self.started:.3f}']
+        return '\n'.join(lines) + '\n'
+
+
+def write_atomic(filename, text):
+    # Readers such as the node_exporter textfile collector never see a partial file
+    tmp_file = filename + '.tmp'
+    with open(tmp_file, 'w') as f:
+        f.write(text)
+    os.replace(tmp_file, filename)
+
+
+def write_summary(metrics, filename, **extra):
+    write_atomic(filename, json.dumps({**extra, **metrics.summary()}, indent=2) + '\n')
+
+
+async def export_prometheus(metrics, filename, labels=None, interval=15):
+    """Rewrite the Prometheus textfile every interval seconds until cancelled."""
+    while True:
+        write_atomic(filename, metrics.to_prometheus(labels))
+        await asyncio.sleep(interval)
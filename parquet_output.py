@@ -0,0 +1,192 @@
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from serializers import ASYNCPRAW_COMMENT_FIELDS, ASYNCPRAW_SUBMISSION_FIELDS, COMMENT_FIELDS, SUBMISSION_FIELDS, dumps
+
+ROW_GROUP_SIZE = 100000
+# Fields outside the schema (and values that do not fit their column's type) go here as one JSON object per row
+OVERFLOW_COLUMN = '_overflow'
+# asyncpraw's bookkeeping attributes are not Reddit data and are left out, so both engines give the same rows
+IGNORED_FIELDS = frozenset(ASYNCPRAW_SUBMISSION_FIELDS + ASYNCPRAW_COMMENT_FIELDS)
+
+STRING_FIELDS = frozenset((
+    'approved_by', 'author', 'author_flair_background_color', 'author_flair_css_class', 'author_flair_template_id',
+    'author_flair_text', 'author_flair_text_color', 'author_flair_type', 'author_fullname', 'banned_by', 'body',
+    'category', 'collapsed_reason', 'collapsed_reason_code', 'comment_type', 'crosspost_parent', 'discussion_type',
+    'distinguished', 'domain', 'id', 'link_flair_background_color', 'link_flair_css_class', 'link_flair_template_id',
+    'link_flair_text', 'link_flair_text_color', 'link_flair_type', 'link_id', 'mod_note', 'mod_reason_by',
+    'mod_reason_title', 'name', 'parent_id', 'permalink', 'post_hint', 'removal_reason', 'removed_by',
+    'removed_by_category', 'selftext', 'subreddit', 'subreddit_id', 'subreddit_name_prefixed', 'subreddit_type',
+    'suggested_sort', 'thumbnail', 'title', 'top_awarded_type', 'unrepliable_reason', 'url', 'url_overridden_by_dest',
+    'whitelist_status',
+))
+INTEGER_FIELDS = frozenset((
+    'controversiality', 'downs', 'gilded', 'num_comments', 'num_crossposts', 'num_reports', 'pwls', 'retrieved_utc',
+    'score', 'subreddit_subscribers', 'thumbnail_height', 'thumbnail_width', 'total_awards_received', 'ups',
+    'view_count', 'wls',
+))
+FLOAT_FIELDS = frozenset(('approved_at_utc', 'banned_at_utc', 'created', 'created_utc', 'upvote_ratio'))
+BOOLEAN_FIELDS = frozenset((
+    'allow_live_comments', 'archived', 'author_cakeday', 'author_is_blocked', 'author_patreon_flair', 'author_premium',
+    'can_gild', 'can_mod_post', 'clicked', 'collapsed', 'collapsed_because_crowd_control', 'contest_mode', 'hidden',
+    'hide_score', 'is_created_from_ads_ui', 'is_crosspostable', 'is_gallery', 'is_meta', 'is_original_content',
+    'is_reddit_media_domain', 'is_robot_indexable', 'is_self', 'is_submitter', 'is_video', 'likes', 'locked',
+    'media_only', 'no_follow', 'over_18', 'pinned', 'quarantine', 'saved', 'score_hidden', 'send_replies', 'spoiler',
+    'stickied', 'visited',
+))
+# Every other schema field (nested objects, lists, and mixed-type fields such as `edited`) is stored as JSON text
+JSON_METADATA = {b'encoding': b'json'}
+
+DATATYPE_FIELDS = {
+    'submissions': SUBMISSION_FIELDS,
+    'comments': COMMENT_FIELDS,
+}
+
+
+def column_type(name):
+    if name in STRING_FIELDS:
+        return pa.string()
+    if name in INTEGER_FIELDS:
+        return pa.int64()
+    if name in FLOAT_FIELDS:
+        return pa.float64()
+    if name in BOOLEAN_FIELDS:
+        return pa.bool_()
+    return None
+
+
+def build_schema(datatype):
+    """Return the fixed Arrow schema of a datatype: the serializer's fields, retrieved_utc and the overflow column."""
+    fields = []
+    for name in DATATYPE_FIELDS[datatype] + ('retrieved_utc',):
+        type_ = column_type(name)
+        fields.append(pa.field(name, pa.string(), metadata=JSON_METADATA) if type_ is None else pa.field(name, type_))
+    fields.append(pa.field(OVERFLOW_COLUMN, pa.string(), metadata=JSON_METADATA))
+    return pa.schema(fields, metadata={b'datatype': datatype.encode()})
+
+
+def is_json_field(field):
+    return field.metadata == JSON_METADATA
+
+
+def allowed_types(type_):
+    # Checked exactly: pyarrow would silently turn booleans into numbers and truncate floats in integer columns
+    if type_ == pa.string():
+        return (str,)
+    if type_ == pa.int64():
+        return (int,)
+    if type_ == pa.float64():
+        return (int, float)
+    return (bool,)
+
+
+def fits(value, allowed):
+    if type(value) not in allowed:
+        return False
+    return type(value) is not int or -2**63 <= value < 2**63
+
+
+def records_to_table(records, schema):
+    """Convert record dicts to a table of the schema, moving unknown fields and mistyped values to the overflow column."""
+    known = set(schema.names) | IGNORED_FIELDS
+    overflow = [{key: value for key, value in record.items() if key not in known} for record in records]
+
+    arrays = []
+    for field in schema:
+        if field.name == OVERFLOW_COLUMN:
+            continue
+        values = [record.get(field.name) for record in records]
+        if is_json_field(field):
+            arrays.append(pa.array([None if value is None else dumps(value, default=str).decode('utf-8') for value in values], pa.string()))
+            continue
+        allowed = allowed_types(field.type)
+        for i, value in enumerate(values):
+            if value is not None and not fits(value, allowed):
+                overflow[i][field.name] = value
+                values[i] = None
+        arrays.append(pa.array(values, field.type))
+
+    arrays.append(pa.array([dumps(extra, default=str).decode('utf-8') if extra else None for extra in overflow], pa.string()))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def readable_parquet(filename):
+    """Return filename if it is a complete Parquet file (footer written), otherwise None."""
+    if not os.path.exists(filename):
+        return None
+    try:
+        pq.ParquetFile(filename)
+    except (pa.ArrowInvalid, OSError):
+        return None
+    return filename
+
+
+class ParquetRecordWriter:
+    """Buffers records and the IDs they belong to, and writes them as Parquet row groups of row_group_size records.
+
+    IDs without a record (not returned by the API) are buffered separately and reported with the next row group.
+    """
+
+    def __init__(self, filename, datatype, row_group_size=ROW_GROUP_SIZE):
+        if pa is None:
+            raise ImportError("Parquet output needs pyarrow")
+        self.filename = filename
+        self.schema = build_schema(datatype)
+        self.row_group_size = row_group_size
+        self.sink = pa.OSFile(filename, 'wb')
+        self.writer = pq.ParquetWriter(self.sink, self.schema, compression='zstd')
+        self.records = []
+        self.ids = []
+        self.missing_ids = []
+
+    def add(self, records, ids, missing_ids=()):
+        """Buffer records along with their IDs (one per record) and the IDs that have no record."""
+        self.records.extend(records)
+        self.ids.extend(ids)
+        self.missing_ids.extend(missing_ids)
+
+    def full(self):
+        return len(self.records) >= self.row_group_size
+
+    def pending(self):
+        return bool(self.records or self.missing_ids)
+
+    def flush(self):
+        """Write up to row_group_size buffered records as one row group.
+
+        Returns the bytes written and the IDs it covers: those of its records and the buffered IDs without a record.
+        """
+        records, self.records = self.records[:self.row_group_size], self.records[self.row_group_size:]
+        ids, self.ids = self.ids[:self.row_group_size], self.ids[self.row_group_size:]
+        ids += self.missing_ids
+        self.missing_ids = []
+        if not records:
+            return 0, ids
+        start = self.sink.tell()
+        self.writer.write_table(records_to_table(records, self.schema), row_group_size=len(records))
+        return self.sink.tell() - start, ids
+
+    def copy_from(self, filename):
+        """Copy the row groups of an earlier output of the same split file and return the IDs they hold."""
+        ids = []
+        parquet_file = pq.ParquetFile(filename)
+        for i in range(parquet_file.num_row_groups):
+            table = parquet_file.read_row_group(i)
+            self.writer.write_table(table, row_group_size=self.row_group_size)
+            ids.extend(table.column('id').to_pylist())
+        return ids
+
+    def close(self):
+        self.writer.close()
+        self.sink.close()
+
+    def discard(self):
+        """Close the file without writing the buffered records or the footer."""
+        self.records, self.ids, self.missing_ids = [], [], []
+        self.writer.is_open = False  # Keeps the ParquetWriter from writing the footer when collected
+        self.sink.close()
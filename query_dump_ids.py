@@ -1,63 +1,106 @@
-import psycopg
-import pandas as pd
-from typing import List
-import sys
-
-def fetch_ids(
-    host: str,
-    port: str,
-    dbname: str,
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from psycopg import sql
+from psycopg_pool import ConnectionPool
+
+from split_ids import BatchWriter
+
+TABLES = {
+    'submission_ids': 'reddit.submissions_arctic',
+    'comment_ids': 'reddit.comments_arctic',
+}
+
+
+def copy_ids(
+    pool: ConnectionPool,
     table_name: str,
-    subreddit: str,
-    output_filepath: str
-) -> None:
+    dataset: str,
+):
     """
-    Performs grouping and aggregation operations on a database table, grouping by week based on created_utc,
-    and saves the results to a CSV file.
+    Streams the IDs of a dataset out of a database table with COPY ... TO STDOUT, yielding
+    the raw lines in chunks as NumPy bytes arrays. Nothing is buffered beyond one chunk.
     """
-    # Establish a connection to the database
-    conn = psycopg.connect(
-        host=host,
-        port=port,
-        dbname=dbname,
-        user="postgres",
+    query = sql.SQL("COPY (SELECT id FROM {} WHERE dataset = {}) TO STDOUT").format(
+        sql.Identifier(*table_name.split('.')),
+        sql.Literal(dataset),
     )
 
-    # Create a cursor object
-    cur = conn.cursor()
-
-    # Construct the SQL query, replacing 'group_by_param' with a date_trunc operation on 'created_utc'
-    query = f"""
-    SELECT id
-    FROM {table_name}
-    WHERE dataset = %s
-    """
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            with cur.copy(query) as copy:
+                remainder = b''
+                for data in copy:
+                    block = remainder + bytes(data)
+                    cut = block.rfind(b'\n') + 1
+                    block, remainder = block[:cut], block[cut:]
+                    if block:
+                        yield np.array(block[:-1].split(b'\n'), dtype=bytes)
+                if remainder:
+                    yield np.array([remainder], dtype=bytes)
 
-    # Execute the query
-    cur.execute(query, (dataset,))
 
-    # Fetch all the results
-    results = cur.fetchall()
+def export_ids(
+    pool: ConnectionPool,
+    table_name: str,
+    dataset: str,
+    output_filepath: str,
+    batch_size: int,
+    compress: bool = False,
+    flat: bool = False,
+) -> int:
+    """
+    Exports the IDs of a dataset directly into the batched split files that split_ids.py produces
+    (or into a single CSV at output_filepath if flat is set) and returns the number of IDs written.
+    """
+    count = 0
+    if flat:
+        with open(output_filepath, 'wb') as f:
+            for ids in copy_ids(pool, table_name, dataset):
+                f.write(b'\n'.join(ids.tolist()) + b'\n')
+                count += len(ids)
+        return count
 
-    # Convert the results to a pandas DataFrame
-    df = pd.DataFrame(results)
+    writer = BatchWriter(output_filepath, batch_size, compress)
+    try:
+        for ids in copy_ids(pool, table_name, dataset):
+            writer.write(ids)
+            count += len(ids)
+    finally:
+        writer.close()
+    return count
 
-    # Save the DataFrame to a CSV file
-    df.to_csv(output_filepath, index=False)
 
-    # Close the cursor and the connection
-    cur.close()
-    conn.close()
+def main():
+    parser = argparse.ArgumentParser(description='Export submission and comment IDs of datasets from Postgres')
+    parser.add_argument('datasets', type=str, help='Comma-separated datasets to export')
+    parser.add_argument('--host', type=str, default='localhost', help='Database host')
+    parser.add_argument('--port', type=str, default='5432', help='Database port')
+    parser.add_argument('--dbname', type=str, default='datasets', help='Database name')
+    parser.add_argument('--user', type=str, default='postgres', help='Database user')
+    parser.add_argument('--workers', type=int, default=4, help='Number of exports (and connections) running in parallel')
+    parser.add_argument('--batch_size', type=int, default=1000000, help='Number of IDs per split file (default: 1,000,000)')
+    parser.add_argument('--compress', action='store_true', help='Write zstd-compressed .txt.zst split files')
+    parser.add_argument('--flat', action='store_true', help='Write one CSV per dataset and table instead of split files (e.g. to run split_ids.py --remove on it)')
+    args = parser.parse_args()
 
-if __name__ == "__main__":
+    conninfo = f"host={args.host} port={args.port} dbname={args.dbname} user={args.user}"
+    jobs = [
+        (table_name, dataset, f'data/ids/{prefix}_{dataset}.csv')
+        for dataset in args.datasets.split(',')
+        for prefix, table_name in TABLES.items()
+    ]
 
-    host = "localhost"
-    port = "5432"
-    dbname = "datasets"
+    with ConnectionPool(conninfo, min_size=1, max_size=args.workers) as pool:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futures = {
+                executor.submit(export_ids, pool, table_name, dataset, output_filepath, args.batch_size, args.compress, args.flat): (table_name, dataset)
+                for table_name, dataset, output_filepath in jobs
+            }
+            for future, (table_name, dataset) in futures.items():
+                print(f"Done: {dataset} {table_name} ({future.result()} IDs)")
 
-    dataset = sys.argv[1].split(',')
 
-    for dataset in dataset:
-        fetch_ids(host, port, dbname, 'reddit.submissions_arctic', dataset, f'data/ids/submission_ids_{dataset}.csv')
-        fetch_ids(host, port, dbname, 'reddit.comments_arctic', dataset, f'data/ids/comment_ids_{dataset}.csv')
-        print(f"Done: {dataset}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import aiohttp
+from asyncprawcore.exceptions import TooManyRequests
+
+from serializers import loads
+
+TOKEN_URL = 'https://www.reddit.com/api/v1/access_token'
+INFO_URL = 'https://oauth.reddit.com/api/info'
+# Refresh the OAuth token this many seconds before Reddit says it expires
+TOKEN_MARGIN = 60
+
+
+def create_session(limit=100):
+    """Create the pooled HTTP session shared by all raw clients."""
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=limit), timeout=aiohttp.ClientTimeout(total=60))
+
+
+async def read_json(response):
+    return loads(await response.read())
+
+
+class RawRedditClient:
+    """Calls /api/info directly and returns the children's data dicts, without building asyncpraw models.
+
+    The access token is reused until shortly before it expires. Rate-limit headers are exposed through
+    `limits` in the same shape as asyncpraw's `reddit.auth.limits`.
+    """
+
+    def __init__(self, auth_data, session, token_url=None, info_url=None):
+        self.auth_data = auth_data
+        self.session = session
+        # Credentials may point at other endpoints with asyncpraw's reddit_url/oauth_url settings
+        if token_url is None:
+            token_url = f"{auth_data['reddit_url']}/api/v1/access_token" if 'reddit_url' in auth_data else TOKEN_URL
+        if info_url is None:
+            info_url = f"{auth_data['oauth_url']}/api/info" if 'oauth_url' in auth_data else INFO_URL
+        self.token_url = token_url
+        self.info_url = info_url
+        self.user_agent = auth_data['user_agent']
+        self.limits = {'remaining': None, 'reset_timestamp': None, 'used': None}
+        self._access_token = None
+        self._token_expires = 0.0
+        self._token_lock = asyncio.Lock()
+
+    async def _fetch_token(self):
+        if self.auth_data.get('username') and self.auth_data.get('password'):
+            data = {'grant_type': 'password', 'username': self.auth_data['username'], 'password': self.auth_data['password']}
+        else:
+            data = {'grant_type': 'client_credentials'}
+
+        async with self.session.post(
+            self.token_url,
+            data=data,
+            auth=aiohttp.BasicAuth(self.auth_data['client_id'], self.auth_data['client_secret']),
+            headers={'User-Agent': self.user_agent},
+        ) as response:
+            response.raise_for_status()
+            token = await read_json(response)
+
+        if 'access_token' not in token:
+            raise RuntimeError(f"Could not obtain an access token: {token.get('error', token)}")
+        self._access_token = token['access_token']
+        self._token_expires = time.time() + token.get('expires_in', 3600) - TOKEN_MARGIN
+
+    async def token(self, force=False):
+        async with self._token_lock:
+            if force or self._access_token is None or time.time() >= self._token_expires:
+                await self._fetch_token()
+            return self._access_token
+
+    def _update_limits(self, headers):
+        if 'x-ratelimit-remaining' not in headers:
+            return
+        self.limits = {
+            'remaining': float(headers['x-ratelimit-remaining']),
+            'reset_timestamp': time.time() + int(float(headers['x-ratelimit-reset'])),
+            'used': int(float(headers['x-ratelimit-used'])),
+        }
+
+    async def info(self, fullnames):
+        """Return the data dicts of the items found for fullnames, in the order Reddit returns them."""
+        params = {'id': ','.join(fullnames), 'raw_json': '1'}
+        for attempt in range(2):
+            token = await self.token(force=attempt > 0)
+            async with self.session.get(
+                self.info_url,
+                params=params,
+                headers={'Authorization': f"bearer {token}", 'User-Agent': self.user_agent},
+            ) as response:
+                self._update_limits(response.headers)
+                if response.status == 401 and attempt == 0:
+                    continue  # Token revoked or expired early, fetch a new one and retry once
+                if response.status == 429:
+                    raise TooManyRequests(response)
+                response.raise_for_status()
+                listing = await read_json(response)
+            return [child['data'] for child in listing['data']['children']]
+
+    async def close(self):
+        pass
@@ -0,0 +1,109 @@
+from array import array
+from bisect import bisect_left
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BASE36_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+# Longest base36 string that fits in an int64
+MAX_BASE36_WIDTH = 12
+
+# Split file name prefix and fullname prefix of each datatype
+DATATYPES = {
+    'submissions': ('submission_ids', 't3_'),
+    'comments': ('comment_ids', 't1_'),
+}
+
+
+def b36decode(id_):
+    """Decode a base36 Reddit ID (without the t1_/t3_ prefix) to an integer."""
+    return int(id_, 36)
+
+
+def b36encode(value):
+    """Encode an integer as a base36 Reddit ID."""
+    if value == 0:
+        return '0'
+    digits = []
+    while value:
+        value, digit = divmod(value, 36)
+        digits.append(BASE36_DIGITS[digit])
+    return ''.join(reversed(digits))
+
+
+class ProcessedIndex:
+    """Set of Reddit IDs stored as a sorted int64 array (8 bytes per ID)."""
+
+    def __init__(self, values=()):
+        self._ids = array('q', sorted(values))
+
+    @classmethod
+    def from_file(cls, filename):
+        """Build the index from a file with one base36 ID per line."""
+        with open(filename) as f:
+            return cls(b36decode(line) for line in (line.strip() for line in f) if line)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, value):
+        if isinstance(value, str):
+            value = b36decode(value)
+        i = bisect_left(self._ids, value)
+        return i < len(self._ids) and self._ids[i] == value
+
+
+def _digit_values():
+    values = np.full(256, -1, dtype=np.int64)
+    for i, digit in enumerate(BASE36_DIGITS):
+        values[ord(digit)] = i
+        values[ord(digit.upper())] = i
+    return values
+
+
+def decode_base36_array(ids):
+    """Decode a NumPy bytes array (dtype 'S') of base36 IDs to int64 without a Python-level loop."""
+    if len(ids) == 0:
+        return np.zeros(0, dtype=np.int64)
+    width = ids.dtype.itemsize
+    if width > MAX_BASE36_WIDTH:
+        raise ValueError(f"IDs longer than {MAX_BASE36_WIDTH} characters do not fit in int64")
+
+    digit_values = _digit_values()
+    chars = np.ascontiguousarray(ids).view(np.uint8).reshape(-1, width)
+    values = np.zeros(len(ids), dtype=np.int64)
+    for col in range(width):
+        # Shorter IDs are NUL-padded on the right
+        present = chars[:, col] != 0
+        digits = digit_values[chars[:, col]]
+        if (present & (digits < 0)).any():
+            bad = ids[(present & (digits < 0)).argmax()]
+            raise ValueError(f"Invalid base36 ID: {bad!r}")
+        values = np.where(present, values * 36 + digits, values)
+    return values
+
+
+def encode_base36_lines(values):
+    """Encode an int64 array as newline-terminated base36 IDs, returned as one bytes object."""
+    values = np.asarray(values, dtype=np.int64)
+    if len(values) == 0:
+        return b''
+    if (values < 0).any():
+        raise ValueError("Cannot encode negative IDs")
+
+    digit_chars = np.frombuffer(BASE36_DIGITS.encode(), dtype=np.uint8)
+    rows = np.zeros((len(values), MAX_BASE36_WIDTH + 1), dtype=np.uint8)
+    rows[:, -1] = ord('\n')
+    remaining = values.copy()
+    lengths = np.ones(len(values), dtype=np.int64)
+    for col in range(MAX_BASE36_WIDTH - 1, -1, -1):
+        rows[:, col] = digit_chars[remaining % 36]
+        remaining //= 36
+        lengths += (remaining > 0)
+
+    # Blank out the leading zeros and drop them when flattening
+    rows[:, :MAX_BASE36_WIDTH][np.arange(MAX_BASE36_WIDTH)[None, :] < (MAX_BASE36_WIDTH - lengths)[:, None]] = 0
+    flat = rows.ravel()
+    return flat[flat != 0].tobytes()
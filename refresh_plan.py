@@ -0,0 +1,197 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import psycopg
+from psycopg import sql
+
+from delta_output import iter_view
+from load_refreshed import TABLES, table_identifier
+from parquet_output import pq
+from reddit_ids import DATATYPES, b36decode
+from split_ids import BatchWriter
+
+# An item is due for a refresh once its last retrieval is older than STALENESS_RATIO times its age,
+# so young items are refreshed often and old ones rarely. The interval is kept within
+# [MIN_INTERVAL, MAX_INTERVAL] seconds.
+STALENESS_RATIO = 0.1
+MIN_INTERVAL = 3600
+MAX_INTERVAL = 180 * 86400
+IDS_PER_REQUEST = 100
+
+# Upper bounds in seconds of the age groups in the plan summary
+AGE_GROUPS = ((86400, '<1d'), (7 * 86400, '<1w'), (30 * 86400, '<30d'), (365 * 86400, '<1y'), (float('inf'), '>=1y'))
+
+
+def plan_datasets(base_folder, datatype, dataset):
+    """Return the dataset and the earlier refresh plans of it (DATASET_refresh_*) that have output for datatype."""
+    data_folder = os.path.join(base_folder, 'data')
+    prefix = f'{datatype}_{dataset}'
+    if not os.path.isdir(data_folder):
+        return []
+    return sorted(
+        f[len(datatype) + 1:] for f in os.listdir(data_folder)
+        if os.path.isdir(os.path.join(data_folder, f)) and (f == prefix or f.startswith(prefix + '_refresh_'))
+    )
+
+
+def read_output_file(outfile):
+    """Return (ids, created_utc, retrieved_utc) arrays of the records of a .ndjson.zst or .parquet output file."""
+    if outfile.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("Reading Parquet output needs pyarrow")
+        table = pq.read_table(outfile, columns=['id', 'created_utc', 'retrieved_utc']).drop_null()
+        ids = [b36decode(id_) for id_ in table.column('id').to_pylist()]
+        created = table.column('created_utc').to_numpy()
+        retrieved = table.column('retrieved_utc').to_numpy()
+    else:
+        ids, created, retrieved = [], [], []
+        # Delta output (see delta_output.py) is read as its base with the deltas applied
+        for record in iter_view(outfile):
+            if record.get('created_utc') is None or record.get('retrieved_utc') is None:
+                continue
+            ids.append(b36decode(record['id']))
+            created.append(record['created_utc'])
+            retrieved.append(record['retrieved_utc'])
+    return np.array(ids, dtype=np.int64), np.array(created, dtype=np.float64), np.array(retrieved, dtype=np.int64)
+
+
+def read_output_state(base_folder, datatype, dataset):
+    """Read created_utc and retrieved_utc of every item scraped for a dataset and its earlier refresh plans."""
+    arrays = []
+    for plan in plan_datasets(base_folder, datatype, dataset):
+        folder = os.path.join(base_folder, f'data/{datatype}_{plan}')
+        for f in sorted(os.listdir(folder)):
+            if f.endswith('.ndjson.zst') or f.endswith('.parquet'):
+                arrays.append(read_output_file(os.path.join(folder, f)))
+    if not arrays:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64), np.zeros(0, dtype=np.int64)
+    return tuple(np.concatenate(columns) for columns in zip(*arrays))
+
+
+def read_database_state(conninfo, datatype, dataset):
+    """Read created_utc and retrieved_utc of a dataset and its refresh plans from the refresh table load_refreshed.py fills."""
+    query = sql.SQL(
+        "COPY (SELECT id, (data->>'created_utc')::float8, retrieved_utc FROM {} "
+        "WHERE (dataset = {} OR dataset LIKE {}) AND retrieved_utc IS NOT NULL AND data ? 'created_utc') "
+        "TO STDOUT (FORMAT BINARY)"
+    ).format(table_identifier(TABLES[datatype]), sql.Literal(dataset), sql.Literal(dataset.replace('_', r'\_') + r'\_refresh\_%'))
+
+    ids, created, retrieved = [], [], []
+    with psycopg.connect(conninfo) as conn:
+        with conn.cursor() as cur:
+            with cur.copy(query) as copy:
+                copy.set_types(['text', 'float8', 'int8'])
+                for id_, created_utc, retrieved_utc in copy.rows():
+                    if created_utc is None:
+                        continue
+                    ids.append(b36decode(id_))
+                    created.append(created_utc)
+                    retrieved.append(retrieved_utc)
+    return np.array(ids, dtype=np.int64), np.array(created, dtype=np.float64), np.array(retrieved, dtype=np.int64)
+
+
+def latest_retrievals(ids, created, retrieved):
+    """Keep the most recent retrieval of each ID."""
+    if len(ids) == 0:
+        return ids, created, retrieved
+    order = np.lexsort((retrieved, ids))
+    ids, created, retrieved = ids[order], created[order], retrieved[order]
+    last = np.append(ids[1:] != ids[:-1], True)
+    return ids[last], created[last], retrieved[last]
+
+
+def staleness(created, retrieved, now, ratio=STALENESS_RATIO, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+    """Time since the last retrieval in units of the item's refresh interval; items at 1 or more are due."""
+    interval = np.clip((now - created) * ratio, min_interval, max_interval)
+    return (now - retrieved) / interval
+
+
+def select_due(scores, budget):
+    """Return the indices of the at most budget items due for a refresh, most overdue first."""
+    due = np.flatnonzero(scores >= 1)
+    if len(due) > budget:
+        due = due[np.argpartition(-scores[due], budget - 1)[:budget]]
+    return due[np.argsort(-scores[due], kind='stable')]
+
+
+def age_summary(ages):
+    counts = []
+    lower = -np.inf
+    for upper, label in AGE_GROUPS:
+        counts.append(f"{label}: {int(((ages >= lower) & (ages < upper)).sum())}")
+        lower = upper
+    return ', '.join(counts)
+
+
+def write_plan(base_folder, datatype, plan, values, split_size, compress=False):
+    """Write the planned IDs in priority order as split files of dataset `plan` and return their folder."""
+    writer = BatchWriter(os.path.join(base_folder, 'data/ids', f'{DATATYPES[datatype][0]}_{plan}.csv'), split_size, compress)
+    try:
+        writer.write_values(values)
+    finally:
+        writer.close()
+    return writer.batch_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plan the next refresh: pick the items most overdue for a rescrape within a request budget and write them as split files')
+    parser.add_argument('--dataset', type=str, required=True, help='Dataset to plan a refresh of; earlier plans of it (DATASET_refresh_*) are taken into account')
+    parser.add_argument('--datatype', type=str, choices=['submissions', 'comments', 'both'], default='submissions', help='Type of data to plan; "both" shares the budget')
+    parser.add_argument('--basefolder', type=str, default='', help='Base folder of the data')
+    parser.add_argument('--source', type=str, choices=['output', 'db'], default='output', help='Read retrieval times from the scraped output or from the refresh tables (see load_refreshed.py)')
+    parser.add_argument('--requests_per_hour', type=int, required=True, help='Info calls per hour available across all accounts')
+    parser.add_argument('--hours', type=float, default=1, help='Hours of requests to plan')
+    parser.add_argument('--staleness_ratio', type=float, default=STALENESS_RATIO, help='Refresh an item once its data is older than this fraction of its age')
+    parser.add_argument('--min_interval', type=float, default=MIN_INTERVAL, help='Shortest refresh interval in seconds')
+    parser.add_argument('--max_interval', type=float, default=MAX_INTERVAL, help='Longest refresh interval in seconds')
+    parser.add_argument('--plan_name', type=str, default=None, help='Suffix of the plan dataset (default: refresh_<UTC time>)')
+    parser.add_argument('--split_size', type=int, default=1000000, help='Number of IDs per split file')
+    parser.add_argument('--compress', action='store_true', help='Write zstd-compressed .txt.zst split files')
+    parser.add_argument('--host', type=str, default='localhost', help='Database host (with --source db)')
+    parser.add_argument('--port', type=str, default='5432', help='Database port (with --source db)')
+    parser.add_argument('--dbname', type=str, default='datasets', help='Database name (with --source db)')
+    parser.add_argument('--user', type=str, default='postgres', help='Database user (with --source db)')
+    args = parser.parse_args()
+
+    now = time.time()
+    datatypes = ['submissions', 'comments'] if args.datatype == 'both' else [args.datatype]
+    plan = f"{args.dataset}_{args.plan_name or time.strftime('refresh_%Y%m%dT%H%M', time.gmtime(now))}"
+    conninfo = f"host={args.host} port={args.port} dbname={args.dbname} user={args.user}"
+
+    states = {}
+    for datatype in datatypes:
+        if args.source == 'db':
+            state = read_database_state(conninfo, datatype, args.dataset)
+        else:
+            state = read_output_state(args.basefolder, datatype, args.dataset)
+        states[datatype] = latest_retrievals(*state)
+
+    # Datatypes compete for the same budget, as the scraper packs both into the same info calls
+    scores = np.concatenate([staleness(created, retrieved, now, args.staleness_ratio, args.min_interval, args.max_interval)
+                             for _, created, retrieved in states.values()])
+    owners = np.concatenate([np.full(len(states[datatype][0]), i) for i, datatype in enumerate(datatypes)])
+    offsets = np.cumsum([0] + [len(states[datatype][0]) for datatype in datatypes])
+    budget = int(args.requests_per_hour * args.hours * IDS_PER_REQUEST)
+    selected = select_due(scores, budget)
+
+    planned = []
+    for i, datatype in enumerate(datatypes):
+        ids, created, retrieved = states[datatype]
+        rows = selected[owners[selected] == i] - offsets[i]
+        print(f"{datatype}: {len(ids)} items, {int((scores[owners == i] >= 1).sum())} due, {len(rows)} planned")
+        if not len(rows):
+            continue
+        print(f"  planned by age: {age_summary(now - created[rows])}")
+        batch_dir = write_plan(args.basefolder, datatype, plan, ids[rows], args.split_size, args.compress)
+        planned.append(datatype)
+        print(f"  wrote {batch_dir}")
+
+    if planned:
+        datatype = 'both' if len(planned) == 2 else planned[0]
+        print(f"Scrape the plan with: python scrape_submissions_split_zstd.py --dataset {plan} --datatype {datatype}")
+
+
+if __name__ == "__main__":
+    main()
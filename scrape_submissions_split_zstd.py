@@ -1,24 +1,69 @@
 import asyncio
-import asyncpraw
 import json
 import logging
 import argparse
-from datetime import datetime
 from tqdm.asyncio import tqdm
 import os
-from itertools import islice
+import random
+import signal
+import time
+from collections import Counter
+import aiohttp
 import zstandard as zstd
+from asyncprawcore.exceptions import ResponseException, ServerError, TooManyRequests
 
-def setup_logging(base_folder, dataset, split_file):
-    log_folder = os.path.join(base_folder, f"log/submissions_{dataset}")
+from account_pool import AccountPool, load_credentials
+from delta_output import HashIndex, content_hash, delta_files, diff_entry, hashes_path, next_delta_path, unchanged_entry, view_sources
+from frame_index import FrameIndex, FrameIndexWriter, build_index, index_path
+from id_sources import ListIdSource, find_split_file, is_split_file, open_id_source
+from metrics import Metrics, export_prometheus, write_atomic, write_summary
+from parquet_output import ROW_GROUP_SIZE, ParquetRecordWriter, readable_parquet
+from reddit_ids import DATATYPES, ProcessedIndex, b36decode
+from serializers import dumps, loads, make_serializer
+from work_queue import HEARTBEATS_PER_LEASE, LEASE_SECONDS, LeaseQueue
+from zstd_dict import latest_dictionary
+
+# A failed info call is retried MAX_ATTEMPTS times, waiting RETRY_BACKOFF * 2^attempt seconds (plus
+# jitter) in between. Batches failing on an error their IDs may cause are then bisected, single IDs that
+# still fail and batches failing on server-side errors are given up on.
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 1
+MAX_RETRY_BACKOFF = 60
+
+def split_name(split_file):
+    # Split files may be zstd-compressed (see split_ids.py --compress) or hold ID ranges (see id_sources.py)
+    name = os.path.basename(split_file)
+    if name.endswith('.zst'):
+        name = name[:-len('.zst')]
+    return os.path.splitext(name)[0]
+
+
+def failed_ids_path(split_file):
+    """Dead-letter file of the IDs of a split file that could not be fetched."""
+    return os.path.join(os.path.dirname(split_file), 'processed', f"{split_name(split_file)}_failed.csv")
+
+
+def checkpoint_path(split_file):
+    return os.path.join(os.path.dirname(split_file), 'processed', f"{split_name(split_file)}_checkpoint.json")
+
+
+def open_job_source(split_file, retry_failed=False):
+    if retry_failed:
+        return ListIdSource.from_file(failed_ids_path(split_file))
+    return open_id_source(split_file)
+
+
+def setup_logging(base_folder, dataset, split_file, resume=False, datatype='submissions'):
+    log_folder = os.path.join(base_folder, f"log/{datatype}_{dataset}")
     os.makedirs(log_folder, exist_ok=True)
 
-    log_file = os.path.join(log_folder, f"{os.path.splitext(os.path.basename(split_file))[0]}_scrapelog.log")
+    log_file = os.path.join(log_folder, f"{split_name(split_file)}_scrapelog.log")
     old_log_file = log_file + '.old'
-    if os.path.exists(old_log_file):
-        os.remove(old_log_file)
-    if os.path.exists(log_file):
-        os.rename(log_file, old_log_file)
+    if not resume:
+        if os.path.exists(old_log_file):
+            os.remove(old_log_file)
+        if os.path.exists(log_file):
+            os.rename(log_file, old_log_file)
 
     scrape_logger = logging.getLogger(f'scrape_logger_{split_file}')
     scrape_logger.setLevel(logging.DEBUG)
@@ -28,12 +73,13 @@ def setup_logging(base_folder, dataset, split_file):
     scrape_handler.setFormatter(scrape_formatter)
     scrape_logger.addHandler(scrape_handler)
 
-    error_log_file = os.path.join(log_folder, f"{os.path.splitext(os.path.basename(split_file))[0]}_errorlog.log")
+    error_log_file = os.path.join(log_folder, f"{split_name(split_file)}_errorlog.log")
     old_error_log_file = error_log_file + '.old'
-    if os.path.exists(old_error_log_file):
-        os.remove(old_error_log_file)
-    if os.path.exists(error_log_file):
-        os.rename(error_log_file, old_error_log_file)
+    if not resume:
+        if os.path.exists(old_error_log_file):
+            os.remove(old_error_log_file)
+        if os.path.exists(error_log_file):
+            os.rename(error_log_file, old_error_log_file)
 
     error_logger = logging.getLogger(f'error_logger_{split_file}')
     error_logger.setLevel(logging.ERROR)
@@ -47,161 +93,896 @@ def setup_logging(base_folder, dataset, split_file):
 
 
 
-async def scrape_submissions(base_folder, dataset, split_file, auth_file, batch_size=1000, reddit_batch_size=100):
-    scrape_logger, error_logger = setup_logging(base_folder, dataset, split_file)
-
-    with open(auth_file) as f:
-        auth_data = json.load(f)
-
-    ids_processed_folder = os.path.join(os.path.dirname(split_file), 'processed')
-    os.makedirs(ids_processed_folder, exist_ok=True)
-
-    processed_ids_file = os.path.join(ids_processed_folder, f"{os.path.splitext(os.path.basename(split_file))[0]}_processed.csv")
-    if os.path.exists(processed_ids_file):
-        os.remove(processed_ids_file)  # Delete the processed IDs file before starting
-
-    processed_ids = set()
-
-    reddit = asyncpraw.Reddit(
-        client_id=auth_data['client_id'],
-        client_secret=auth_data['client_secret'],
-        user_agent=auth_data['user_agent'],
-        username=auth_data['username'],
-        password=auth_data['password']
-    )
-
-    outfile = os.path.join(base_folder, f'data/submissions_{dataset}', f"{os.path.splitext(os.path.basename(split_file))[0]}.ndjson.zst")
-    os.makedirs(os.path.dirname(outfile), exist_ok=True)
-
-    # Rename the existing zst file to .zst.old if it exists
-    if os.path.exists(outfile):
-        old_outfile = outfile + '.old'
-        if os.path.exists(old_outfile):
-            os.remove(old_outfile)
-        os.rename(outfile, old_outfile)
-
-    compressor = zstd.ZstdCompressor(level=3)
-
-    scrape_logger.info(f"Starting to scrape submissions for split file: {split_file}")
-
-    with open(outfile, 'wb') as f:
-        with compressor.stream_writer(f) as writer:
-            with open(split_file) as ids_f:
-                total_ids = sum(1 for _ in ids_f)
-                ids_f.seek(0)
-
-                with tqdm(total=total_ids, desc=f"{os.path.basename(split_file)}") as pbar:
-                    while True:
-                        batch_ids = [line.strip() for line in islice(ids_f, batch_size)]
-                        
-                        if not batch_ids:
-                            break
-
-                        batch_ids = [id for id in batch_ids if id not in processed_ids]
-                        batch_ids = [f't3_{id}' for id in batch_ids]
-                        
-                        processed_batch_ids = []  
-
-                        try:
-                            for i in range(0, len(batch_ids), reddit_batch_size):
-                                reddit_batch = batch_ids[i:i+reddit_batch_size]
-                                async for submission in reddit.info(fullnames=reddit_batch):
-                                    submission_data = vars(submission)
-
-                                    if '_reddit' in submission_data:
-                                        submission_data.pop('_reddit')
-                                    if 'comments' in submission_data:
-                                        submission_data.pop('comments')
-                                    if 'selftext_html' in submission_data:
-                                        submission_data.pop('selftext_html')
-                                    if 'subreddit' in submission_data:
-                                        submission_data['subreddit'] = submission_data['subreddit'].display_name
-                                    if 'author' in submission_data:
-                                        submission_data['author'] = submission_data['author'].name if submission_data['author'] else None
-                                    if 'poll_data' in submission_data:
-                                        poll_data = submission_data['poll_data']
-                                        if poll_data:
-                                            submission_data['poll_data'] = {
-                                                'options': [
-                                                    {
-                                                        'text': option.text,
-                                                        'vote_count': option.vote_count,
-                                                        'id': option.id
-                                                    }
-                                                    for option in poll_data.options
-                                                ] if hasattr(poll_data, 'options') else [],
-                                                'total_vote_count': poll_data.total_vote_count if hasattr(poll_data, 'total_vote_count') else None,
-                                                'user_selection': poll_data.user_selection.text if hasattr(poll_data, 'user_selection') and poll_data.user_selection else None,
-                                                'voting_end_timestamp': poll_data.voting_end_timestamp if hasattr(poll_data, 'voting_end_timestamp') else None
-                                            }
-                                        else:
-                                            submission_data['poll_data'] = None
-
-                                    non_serializable_keys = []
-                                    for key, value in submission_data.items():
-                                        try:
-                                            json.dumps(value)
-                                        except TypeError:
-                                            non_serializable_keys.append(key)
-
-                                    for key in non_serializable_keys:
-                                        submission_data.pop(key)
-
-                                    if non_serializable_keys:
-                                        error_logger.error(f"Non-serializable objects found in submission {submission.id}: {', '.join(non_serializable_keys)}")
-                                        continue
-
-                                    submission_data['retrieved_utc'] = int(datetime.now().timestamp())
-
-                                    writer.write(json.dumps(submission_data).encode('utf-8'))
-                                    writer.write(b'\n')
-
-                                    processed_batch_ids.append(submission.id)
-
-                                writer.flush()
-                                
-                                with open(processed_ids_file, 'a') as processed_f:
-                                    for id in processed_batch_ids:
-                                        processed_f.write(f"{id}\n")
-
-                                pbar.update(len(reddit_batch))
-                                processed_batch_ids = []
-
-                        except Exception as e:
-                            error_message = str(e)
-                            if "Cannot connect to host" in error_message or "Connect call failed" in error_message:
-                                error_logger.error(f"Connection error scraping batch starting from {batch_ids[0]}: {error_message}")
-                            else:
-                                submission_id = submission.id
-                                error_logger.error(f"Error scraping submission {submission_id}: {error_message}")
-    await reddit.close()
+def is_id_error(e):
+    """Return whether an info call error may be caused by the IDs in the batch.
+
+    Only 4xx responses and unparseable payloads are: connection errors, timeouts and 5xx responses
+    are server-side or transient and would fail the same way for either half of the batch.
+    """
+    if isinstance(e, aiohttp.ClientResponseError):
+        return e.status < 500 and e.status != 429
+    if isinstance(e, (ServerError, TooManyRequests)):
+        return False
+    if isinstance(e, ResponseException):
+        return True
+    return isinstance(e, (ValueError, KeyError, TypeError))
+
+
+def log_fetch_error(error_logger, reddit_batch, e, attempt=1):
+    if is_id_error(e):
+        error_logger.error(f"Error scraping batch of {len(reddit_batch)} starting from {reddit_batch[0]} (attempt {attempt}): {e!r}")
+    else:
+        error_logger.error(f"Server or connection error scraping batch of {len(reddit_batch)} starting from {reddit_batch[0]} (attempt {attempt}): {e!r}")
+
+
+async def fetch_with_retries(pool, reddit_batch, error_logger, max_attempts=MAX_ATTEMPTS):
+    """Fetch a batch of fullnames, retrying failed calls and bisecting batches that keep failing.
+
+    Returns the fetched items and the fullnames given up on. A batch that fails max_attempts times
+    with an error one of its IDs may cause is split in half and each half retried on its own, so a
+    single bad ID only costs itself. Batches that keep failing on server-side or transient errors
+    (connection errors, timeouts, 5xx) are given up on as a whole, since splitting them cannot help.
+    """
+    items = []
+    failed = []
+    batches = [reddit_batch]
+    while batches:
+        batch = batches.pop()
+        for attempt in range(1, max_attempts + 1):
+            try:
+                items.extend(await pool.info(batch, error_logger))
+                break
+            except Exception as e:
+                log_fetch_error(error_logger, batch, e, attempt)
+                error = e
+                if attempt < max_attempts:
+                    pool.metrics.count('retries')
+                    await asyncio.sleep(min(RETRY_BACKOFF * 2 ** attempt, MAX_RETRY_BACKOFF) * (1 + random.random()))
+        else:
+            if len(batch) == 1 or not is_id_error(error):
+                failed.extend(batch)
+            else:
+                pool.metrics.count('bisections')
+                half = len(batch) // 2
+                batches += [batch[half:], batch[:half]]
+    return items, failed
+
+
+def read_checkpoint(checkpoint_file):
+    if not os.path.exists(checkpoint_file):
+        return None
+    with open(checkpoint_file) as f:
+        return json.load(f)
+
+
+def write_checkpoint(checkpoint_file, output_bytes, processed_bytes, index_bytes=None, failed_bytes=None, output_file=None, finished=False):
+    # Written to a temporary file and renamed so a crash never leaves a partial checkpoint
+    checkpoint = {'output_bytes': output_bytes, 'processed_bytes': processed_bytes}
+    if finished:
+        checkpoint['finished'] = True
+    if output_file is not None:
+        # Name of the file output_bytes refers to (delta output writes to a new file each run)
+        checkpoint['output_file'] = output_file
+    if index_bytes is not None:
+        checkpoint['index_bytes'] = index_bytes
+    if failed_bytes is not None:
+        checkpoint['failed_bytes'] = failed_bytes
+    tmp_file = checkpoint_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_file, checkpoint_file)
+
+
+def mark_finished(checkpoint_file):
+    """Flag the checkpoint of a split file whose IDs have all been scraped, so --resume skips it."""
+    checkpoint = read_checkpoint(checkpoint_file) or {'output_bytes': 0, 'processed_bytes': 0}
+    checkpoint.pop('finished', None)
+    write_checkpoint(checkpoint_file, finished=True, **checkpoint)
+
+
+def split_file_finished(split_file):
+    checkpoint = read_checkpoint(checkpoint_path(split_file))
+    return checkpoint is not None and checkpoint.get('finished', False)
+
+
+def restore_checkpoint(checkpoint_file, outfile, processed_ids_file, failed_ids_file=None):
+    """Truncate the output, processed and failed IDs files back to the last checkpoint. Returns None if they cannot be resumed."""
+    checkpoint = read_checkpoint(checkpoint_file)
+    if checkpoint is None or not os.path.exists(outfile) or not os.path.exists(processed_ids_file):
+        return None
+    if checkpoint.get('output_file', os.path.basename(outfile)) != os.path.basename(outfile):
+        return None
+    if os.path.getsize(outfile) < checkpoint['output_bytes'] or os.path.getsize(processed_ids_file) < checkpoint['processed_bytes']:
+        return None
+
+    os.truncate(outfile, checkpoint['output_bytes'])
+    os.truncate(processed_ids_file, checkpoint['processed_bytes'])
+    if failed_ids_file is not None and os.path.exists(failed_ids_file):
+        os.truncate(failed_ids_file, min(checkpoint.get('failed_bytes', 0), os.path.getsize(failed_ids_file)))
+    return checkpoint
+
+
+def open_index_writer(outfile, checkpoint, scrape_logger):
+    index_file = index_path(outfile)
+    if checkpoint is None:
+        return FrameIndexWriter(index_file)
+
+    index_bytes = checkpoint.get('index_bytes')
+    if index_bytes is None or not os.path.exists(index_file) or os.path.getsize(index_file) < index_bytes:
+        scrape_logger.info(f"Rebuilding frame index of {outfile}")
+        build_index(outfile, index_file)
+        index_bytes = os.path.getsize(index_file)
+    return FrameIndexWriter(index_file, truncate_to=index_bytes)
+
+
+def item_fullname(item):
+    # The raw engine returns data dicts, asyncpraw returns Submission and Comment objects
+    return item['name'] if isinstance(item, dict) else item.fullname
+
+
+class SplitFileOutput:
+    """Output, processed IDs, checkpoint and logs of one split file scraped by a pipeline, written as .ndjson.zst."""
+
+    extension = '.ndjson.zst'
+
+    def __init__(self, base_folder, dataset, datatype, split_file, engine='asyncpraw', resume=False, retry_failed=False, **output_options):
+        self.datatype = datatype
+        self.split_file = split_file
+        self.prefix = DATATYPES[datatype][1]
+        # Retrying failed IDs appends to the existing output, like a resume
+        resume = resume or retry_failed
+        self.scrape_logger, self.error_logger = setup_logging(base_folder, dataset, split_file, resume=resume, datatype=datatype)
+        self.metrics = Metrics()
+        self.metrics_file = os.path.join(base_folder, f"log/{datatype}_{dataset}", f"{split_name(split_file)}_metrics.json")
+
+        ids_processed_folder = os.path.join(os.path.dirname(split_file), 'processed')
+        os.makedirs(ids_processed_folder, exist_ok=True)
+
+        self.processed_ids_file = os.path.join(ids_processed_folder, f"{split_name(split_file)}_processed.csv")
+        self.checkpoint_file = checkpoint_path(split_file)
+        self.failed_ids_file = failed_ids_path(split_file)
+
+        outfile = os.path.join(base_folder, f'data/{datatype}_{dataset}', f"{split_name(split_file)}{self.extension}")
+        os.makedirs(os.path.dirname(outfile), exist_ok=True)
+
+        self.serializer = make_serializer(datatype, engine, self.scrape_logger, self.error_logger)
+        self.encode = self.serializer.serialize
+        self.processed_ids = self.open_output(outfile, resume, retry_failed, **output_options)
+        # When retrying, the failed IDs are read up front: IDs that fail again are appended to the same
+        # file, and the ones recovered are skipped on later retries as they are in the processed IDs.
+        self.id_source = open_job_source(split_file, retry_failed)
+
+        # Info batches holding IDs of this split file that are not committed yet, and whether
+        # the producer has read all of its IDs. The file is finished when both are done.
+        self.pending = 0
+        self.exhausted = False
+        # Called with `finished` once the split file is closed (e.g. to release its lease)
+        self.on_close = None
+        # Time the split file's lease runs out unless renewed (see work_queue.py). Once it is lost,
+        # another worker may resume the split file, so nothing more is written to its files.
+        self.lease_expires = None
+        self.lost = False
+
+        self.scrape_logger.info(f"Starting to scrape {datatype} for split file: {split_file}")
+        self.processed_f = open(self.processed_ids_file, 'a')
+        # Opened when the first ID is given up on, so only split files with failed IDs have a failed IDs file
+        self.failed_f = None
+
+    def start_fresh(self, previous_files):
+        # Delete the processed and failed IDs files before starting
+        for previous_file in (self.processed_ids_file, self.failed_ids_file):
+            if os.path.exists(previous_file):
+                os.remove(previous_file)
+
+        # Rename the existing output files to .old if they exist
+        for previous_file in previous_files:
+            if os.path.exists(previous_file):
+                old_file = previous_file + '.old'
+                if os.path.exists(old_file):
+                    os.remove(old_file)
+                os.rename(previous_file, old_file)
+
+    def open_output(self, outfile, resume, retry_failed, seekable=False, use_dictionary=False, compression_threads=0, **ignored_options):
+        """Open the output for appending and return the IDs it already holds. Options of other output formats are ignored."""
+        # On resume, the output and processed IDs are rolled back to the last checkpoint: every
+        # checkpoint ends a zstd frame, so new frames are appended after the last complete one.
+        checkpoint = restore_checkpoint(self.checkpoint_file, outfile, self.processed_ids_file, self.failed_ids_file) if resume else None
+        if checkpoint is None and retry_failed:
+            raise RuntimeError(f"Cannot retry the failed IDs of {self.split_file} without a usable checkpoint")
+        if checkpoint is not None:
+            processed_ids = ProcessedIndex.from_file(self.processed_ids_file)
+            self.scrape_logger.info(f"Resuming split file {self.split_file} with {len(processed_ids)} processed IDs")
+        else:
+            if resume:
+                self.scrape_logger.info(f"No usable checkpoint for split file {self.split_file}, starting from scratch")
+            processed_ids = ProcessedIndex()
+            # Deltas and hashes of an earlier delta output do not apply to a new base
+            self.start_fresh((outfile, index_path(outfile), hashes_path(outfile), *delta_files(outfile)))
+            write_checkpoint(self.checkpoint_file, 0, 0, output_file=os.path.basename(outfile))
+
+        # In seekable mode every frame (one per info batch) is recorded in a sidecar ID index
+        self.index_writer = None
+        if seekable:
+            self.index_writer = open_index_writer(outfile, checkpoint, self.scrape_logger)
+        elif os.path.exists(index_path(outfile)):
+            os.remove(index_path(outfile))  # Would go stale as frames are appended
+
+        # Frames can use a dictionary trained on earlier output (see zstd_dict.py); readers find it by the ID in the frame header
+        dictionary = None
+        if use_dictionary:
+            dictionary = latest_dictionary(os.path.dirname(outfile))
+            if dictionary is None:
+                raise RuntimeError(f"No zstd dictionary in {os.path.dirname(outfile)}, train one with zstd_dict.py")
+            dictionary.precompute_compress(level=3)  # Loaded once instead of for every frame
+            self.scrape_logger.info(f"Compressing with zstd dictionary {dictionary.dict_id()}")
+
+        self.f = open(outfile, 'ab')
+        self.writer = zstd.ZstdCompressor(level=3, dict_data=dictionary, threads=compression_threads).stream_writer(self.f)
+        return processed_ids
+
+    def record_ids(self, processed_batch_ids, failed_batch_ids):
+        for id in processed_batch_ids:
+            self.processed_f.write(f"{id}\n")
+        self.processed_f.flush()
+
+        if failed_batch_ids:
+            self.error_logger.error(f"Giving up on {len(failed_batch_ids)} IDs, written to {self.failed_ids_file}")
+            if self.failed_f is None:
+                self.failed_f = open(self.failed_ids_file, 'a')
+            for id in failed_batch_ids:
+                self.failed_f.write(f"{id}\n")
+            self.failed_f.flush()
+
+    def commit(self, lines, processed_batch_ids, failed_batch_ids, missing_batch_ids=()):
+        """Write one info batch worth of records and IDs and checkpoint them. Returns the compressed size.
+
+        IDs the API did not return are recorded as processed along with those of the records, so a
+        resume does not request them again.
+        """
+        frame_offset = self.f.tell()
+        self.writer.write(b''.join(lines))
+        self.writer.flush(zstd.FLUSH_FRAME)
+
+        if self.index_writer is not None:
+            self.index_writer.add_frame(frame_offset, self.f.tell() - frame_offset, processed_batch_ids, [len(line) for line in lines])
+            self.index_writer.flush()
+
+        # IDs are only recorded once their records have been flushed to the output
+        self.record_ids([*processed_batch_ids, *missing_batch_ids], failed_batch_ids)
+
+        write_checkpoint(self.checkpoint_file, self.f.tell(), self.processed_f.tell(),
+                         self.index_writer.tell() if self.index_writer is not None else None, self.failed_bytes(),
+                         os.path.basename(self.f.name))
+        return self.f.tell() - frame_offset
+
+    def failed_bytes(self):
+        if self.failed_f is not None:
+            return self.failed_f.tell()
+        # Failed IDs of earlier runs are kept when resuming
+        return os.path.getsize(self.failed_ids_file) if os.path.exists(self.failed_ids_file) else 0
+
+    def close_output(self, finished):
+        self.writer.close()
+        self.f.close()
+        if self.index_writer is not None:
+            if finished:
+                self.index_writer.finalize()
+            else:
+                self.index_writer.close()
+
+    def discard_output(self):
+        # Closing the stream writer would end the output with one more frame
+        self.f.close()
+        if self.index_writer is not None:
+            self.index_writer.close()
+
+    def holds_lease(self):
+        """Whether the split file can still be written to: False once its lease was lost or ran out without being renewed."""
+        if self.lease_expires is not None and time.time() > self.lease_expires:
+            self.lost = True
+        return not self.lost
+
+    def close(self, finished):
+        if self.lost:
+            # Everything committed so far stays; the worker that resumes the split file continues from it
+            self.discard_output()
+            self.processed_f.close()
+            if self.failed_f is not None:
+                self.failed_f.close()
+            self.scrape_logger.info(f"Stopped split file {self.split_file} after losing its lease")
+            if self.on_close is not None:
+                self.on_close(False)
+            return
+
+        self.close_output(finished)
+        self.processed_f.close()
+        if self.failed_f is not None:
+            self.failed_f.close()
+        if finished:
+            mark_finished(self.checkpoint_file)
+        write_summary(self.metrics, self.metrics_file, split_file=self.split_file, datatype=self.datatype, finished=finished)
+
+        if finished:
+            self.scrape_logger.info(f"Finished split file: {self.split_file}")
+        else:
+            self.scrape_logger.info(f"Stopped early on split file: {self.split_file}")
+        if self.on_close is not None:
+            self.on_close(finished)
+
+
+class ParquetSplitFileOutput(SplitFileOutput):
+    """Writes the records of a split file to Parquet with a fixed schema, in row groups of row_group_size records.
+
+    Parquet files cannot be appended to, so records are written to a .partial file that is renamed once
+    the split file is finished. IDs are recorded as processed when their row group is written; a stopped
+    run leaves a complete .partial file whose row groups are carried over on resume, while a crash
+    leaves none and the split file starts over.
+    """
+
+    extension = '.parquet'
+
+    def open_output(self, outfile, resume, retry_failed, row_group_size=ROW_GROUP_SIZE, **ignored_options):
+        self.outfile = outfile
+        self.encode = self.serializer.record
+        partial_file = outfile + '.partial'
+        # Parquet output is not checkpointed; the checkpoint a finished run leaves only marks it finished
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+
+        previous = None
+        if resume:
+            previous = readable_parquet(partial_file) or readable_parquet(outfile)
+        if previous is None and retry_failed:
+            raise RuntimeError(f"Cannot retry the failed IDs of {self.split_file} without a readable Parquet output")
+
+        if previous is None:
+            if resume:
+                self.scrape_logger.info(f"No readable Parquet output for split file {self.split_file}, starting from scratch")
+            self.start_fresh((outfile, partial_file))
+            self.writer = ParquetRecordWriter(partial_file, self.datatype, row_group_size)
+            return ProcessedIndex()
+
+        # The finished or stopped output is copied into the new .partial file, and the processed IDs are
+        # rebuilt from it and from the IDs the API did not return, which only the processed IDs file holds
+        resumed_file = partial_file + '.resume'
+        os.replace(previous, resumed_file)
+        self.writer = ParquetRecordWriter(partial_file, self.datatype, row_group_size)
+        ids = self.writer.copy_from(resumed_file)
+        os.remove(resumed_file)
+        if os.path.exists(self.processed_ids_file):
+            output_ids = ProcessedIndex(b36decode(id) for id in ids)
+            with open(self.processed_ids_file) as f:
+                ids += [id for id in (line.strip() for line in f) if id and id not in output_ids]
+        with open(self.processed_ids_file, 'w') as f:
+            f.writelines(f"{id}\n" for id in ids)
+        self.scrape_logger.info(f"Resuming split file {self.split_file} with {len(ids)} processed IDs")
+        return ProcessedIndex(b36decode(id) for id in ids)
+
+    def commit(self, records, processed_batch_ids, failed_batch_ids, missing_batch_ids=()):
+        """Buffer one info batch worth of records. Returns the bytes written if a row group was completed."""
+        self.writer.add(records, processed_batch_ids, missing_batch_ids)
+        output_bytes = 0
+        while self.writer.full():
+            output_bytes += self.flush_row_group()
+        self.record_ids([], failed_batch_ids)
+        return output_bytes
+
+    def flush_row_group(self):
+        output_bytes, ids = self.writer.flush()
+        self.record_ids(ids, [])
+        return output_bytes
+
+    def close_output(self, finished):
+        while self.writer.pending():
+            self.metrics.count('output_bytes', self.flush_row_group())
+        self.writer.close()
+        if finished:
+            os.replace(self.writer.filename, self.outfile)
+
+    def discard_output(self):
+        self.writer.discard()
+
+
+class DeltaSplitFileOutput(SplitFileOutput):
+    """Writes only what changed since the previous snapshot of a split file (see delta_output.py).
+
+    The first run writes the base snapshot in full. Later runs keep it and write a new delta file,
+    comparing each record's content hash with the per-ID hash index of the previous view: unchanged
+    records are only stamped with their new retrieved_utc, changed ones are written in full, or with
+    field_diffs as the fields that differ from the base record. Resuming continues the file the
+    checkpoint belongs to.
+    """
+
+    def open_output(self, outfile, resume, retry_failed, field_diffs=False, **output_options):
+        self.base_file = outfile
+        self.encode = self.encode_entry
+        deltas = delta_files(outfile)
+
+        checkpoint = read_checkpoint(self.checkpoint_file) if resume else None
+        if checkpoint is not None and 'output_file' in checkpoint:
+            target = os.path.join(os.path.dirname(outfile), checkpoint['output_file'])
+        elif resume:
+            target = deltas[-1] if deltas else outfile
+        else:
+            target = next_delta_path(outfile) if os.path.exists(outfile) else outfile
+
+        self.writes_base = target == outfile
+        self.previous_files = [] if self.writes_base else [outfile] + [delta for delta in deltas if delta != target]
+        # A resumed run has no hashes of what it wrote before, so it leaves the stored index to be rebuilt
+        self.resumed = resume
+        self.new_ids, self.new_hashes = [], []
+        self.hash_index = HashIndex()
+        self.base_index = None
+        if not self.writes_base:
+            self.hash_index = HashIndex.load(outfile, self.previous_files[1:], self.scrape_logger)
+            if field_diffs:
+                if not os.path.exists(index_path(outfile)):
+                    self.scrape_logger.info(f"Building frame index of {outfile} for field diffs")
+                    build_index(outfile)
+                self.base_index = FrameIndex(outfile)
+            self.scrape_logger.info(f"Writing changes since {len(self.hash_index)} records of {os.path.basename(outfile)} to {os.path.basename(target)}")
+        return super().open_output(target, resume, retry_failed, **output_options)
+
+    def encode_entry(self, item):
+        record = self.serializer.record(item)
+        item_id = self.serializer.item_id(item)
+        line = self.serializer.encode(record, item_id)
+        if line is None:
+            return None
+        return item_id, content_hash(record), record, line
+
+    def commit(self, entries, processed_batch_ids, failed_batch_ids, missing_batch_ids=()):
+        """Write one info batch worth of delta entries (one per record) and checkpoint them. Returns the compressed size."""
+        ids = [entry[0] for entry in entries]
+        hashes = [entry[1] for entry in entries]
+        self.new_ids.extend(b36decode(id_) for id_ in ids)
+        self.new_hashes.extend(hashes)
+        if self.writes_base:
+            return super().commit([entry[3] for entry in entries], processed_batch_ids, failed_batch_ids, missing_batch_ids)
+
+        unchanged = self.hash_index.unchanged(ids, hashes)
+        base_lines = {}
+        if self.base_index is not None:
+            base_lines = self.base_index.get_many([id_ for id_, same in zip(ids, unchanged) if not same])
+
+        lines = []
+        for (id_, _, record, line), same in zip(entries, unchanged):
+            if same:
+                lines.append(dumps(unchanged_entry(record)) + b'\n')
+            elif id_ in base_lines:
+                lines.append(dumps(diff_entry(record, loads(base_lines[id_]))) + b'\n')
+            else:
+                lines.append(line)
+        self.metrics.count('unchanged_records', sum(unchanged))
+        return super().commit(lines, processed_batch_ids, failed_batch_ids, missing_batch_ids)
+
+    def close_output(self, finished):
+        super().close_output(finished)
+        if finished and not self.resumed:
+            target = self.f.name
+            index = self.hash_index.updated(self.new_ids, self.new_hashes, view_sources(self.previous_files + [target]))
+            index.save(self.base_file)
+
+
+OUTPUTS = {
+    'ndjson': SplitFileOutput,
+    'parquet': ParquetSplitFileOutput,
+    'delta': DeltaSplitFileOutput,
+}
+
+
+async def scrape_pipeline(next_part, pool, batch_size=1000, reddit_batch_size=100, concurrency=1, preserve_order=False, queue_size=None,
+                          stop_event=None, progress=None):
+    """Scrape split files one after another through a single fetch pipeline.
+
+    next_part() returns the SplitFileOutput of the next split file, or None when there are no more.
+    Info batches are packed across split file boundaries (and across datatypes, so t1_ and t3_
+    fullnames can share a call), and every returned item is routed back to the file it came from.
+    """
+    # Pipeline: producer -> `concurrency` fetchers -> serializer -> single writer.
+    # The queues are bounded and `in_flight` caps the number of info batches held
+    # anywhere in the pipeline (including the reorder buffer when preserve_order is set).
+    queue_size = queue_size or 2 * concurrency
+    fetch_queue = asyncio.Queue(maxsize=queue_size)
+    serialize_queue = asyncio.Queue(maxsize=queue_size)
+    write_queue = asyncio.Queue(maxsize=queue_size)
+    in_flight = asyncio.Semaphore(concurrency + 3 * queue_size)
+
+    open_parts = []
+    metrics = pool.metrics
+
+    def count(part, name, n):
+        part.metrics.count(name, n)
+        metrics.count(name, n)
+
+    def stopped():
+        return stop_event is not None and stop_event.is_set()
+
+    def close_if_done(part):
+        # A split file whose lease was lost is closed as soon as none of its batches is in flight
+        if part.pending == 0 and (part.exhausted or part.lost) and part in open_parts:
+            open_parts.remove(part)
+            part.close(finished=not part.lost)
+
+    async def produce():
+        seq = 0
+        reddit_batch, owners = [], {}
+
+        async def emit():
+            nonlocal seq, reddit_batch, owners
+            await in_flight.acquire()
+            await fetch_queue.put((seq, reddit_batch, owners))
+            seq += 1
+            reddit_batch, owners = [], {}
+
+        while not stopped():
+            part = next_part()
+            if part is None:
+                break
+            open_parts.append(part)
+
+            for batch_ids in part.id_source.batches(batch_size):
+                if stopped():
+                    break
+                if part.lost:
+                    close_if_done(part)
+                    break
+
+                if part.processed_ids:
+                    unprocessed_ids = [id for id in batch_ids if id and id not in part.processed_ids]
+                    if progress is not None:
+                        progress.update(len(batch_ids) - len(unprocessed_ids))
+                    batch_ids = unprocessed_ids
+
+                for id in batch_ids:
+                    if part.lost:
+                        break
+                    fullname = f'{part.prefix}{id}'
+                    # IDs of a split file are contiguous within a batch, so it enters a batch at most once
+                    if not reddit_batch or owners[reddit_batch[-1]] is not part:
+                        part.pending += 1
+                    reddit_batch.append(fullname)
+                    owners[fullname] = part
+                    if len(reddit_batch) == reddit_batch_size:
+                        await emit()
+            else:
+                part.exhausted = True
+                close_if_done(part)
+
+        # The last batch is only sent partially filled once no split file is left to top it up
+        if reddit_batch:
+            await emit()
+
+        for _ in range(concurrency):
+            await fetch_queue.put(None)
+
+    async def fetch():
+        while True:
+            item = await fetch_queue.get()
+            if item is None:
+                break
+
+            seq, reddit_batch, owners = item
+            start = time.perf_counter()
+            items, failed = await fetch_with_retries(pool, reddit_batch, owners[reddit_batch[0]].error_logger)
+            elapsed = time.perf_counter() - start
+            metrics.add_stage_time('fetch', elapsed)
+            metrics.observe_latency('fetch', elapsed)
+            for part in set(owners.values()):
+                part.metrics.add_stage_time('fetch', elapsed)
+                part.metrics.observe_latency('fetch', elapsed)
+            await serialize_queue.put((seq, reddit_batch, owners, items, failed))
+
+        await serialize_queue.put(None)
+
+    async def serialize():
+        finished = 0
+        while finished < concurrency:
+            item = await serialize_queue.get()
+            if item is None:
+                finished += 1
+                continue
+
+            seq, reddit_batch, owners, items, failed = item
+            results = {part: ([], [], [], []) for part in set(owners.values())}
+            returned = set()
+            for item in items:
+                fullname = item_fullname(item)
+                part = owners.get(fullname)
+                if part is None:
+                    continue
+                returned.add(fullname)
+                start = time.perf_counter()
+                line = part.encode(item)
+                elapsed = time.perf_counter() - start
+                part.metrics.add_stage_time('serialize', elapsed)
+                metrics.add_stage_time('serialize', elapsed)
+                count(part, 'returned_ids', 1)
+                if line is None:
+                    continue
+                lines, processed_batch_ids, _, _ = results[part]
+                lines.append(line)
+                processed_batch_ids.append(part.serializer.item_id(item))
+            for fullname in failed:
+                part = owners[fullname]
+                results[part][2].append(fullname[len(part.prefix):])
+            # IDs that were not given up on but are not in the response were deleted or never existed
+            failed = set(failed)
+            for fullname in reddit_batch:
+                if fullname not in returned and fullname not in failed:
+                    part = owners[fullname]
+                    results[part][3].append(fullname[len(part.prefix):])
+
+            await write_queue.put((seq, reddit_batch, owners, results))
+
+        await write_queue.put(None)
+
+    async def write():
+        def commit(reddit_batch, owners, results):
+            for part, requested in Counter(owners[fullname] for fullname in reddit_batch).items():
+                if not part.holds_lease():
+                    # Dropped: the worker that took over the split file scrapes these IDs again
+                    part.pending -= 1
+                    close_if_done(part)
+                    continue
+                lines, processed_batch_ids, failed_batch_ids, missing_batch_ids = results[part]
+                start = time.perf_counter()
+                output_bytes = part.commit(lines, processed_batch_ids, failed_batch_ids, missing_batch_ids)
+                elapsed = time.perf_counter() - start
+                part.metrics.add_stage_time('write', elapsed)
+                metrics.add_stage_time('write', elapsed)
+                count(part, 'requested_ids', requested)
+                count(part, 'records', len(lines))
+                count(part, 'output_bytes', output_bytes)
+                count(part, 'failed_ids', len(failed_batch_ids))
+                if progress is not None:
+                    progress.update(requested)
+                part.pending -= 1
+                close_if_done(part)
+            in_flight.release()
+
+        pending = {}
+        next_seq = 0
+        while True:
+            item = await write_queue.get()
+            if item is None:
+                break
+
+            if not preserve_order:
+                commit(*item[1:])
+                continue
+
+            pending[item[0]] = item[1:]
+            while next_seq in pending:
+                commit(*pending.pop(next_seq))
+                next_seq += 1
+
+    tasks = [asyncio.create_task(produce())]
+    tasks += [asyncio.create_task(fetch()) for _ in range(concurrency)]
+    tasks.append(asyncio.create_task(serialize()))
+    tasks.append(asyncio.create_task(write()))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        for part in open_parts:
+            part.close(finished=False)
+
+
+async def scrape_submissions(base_folder, dataset, split_file, auth_file, batch_size=1000, reddit_batch_size=100, concurrency=1, preserve_order=False, queue_size=None,
+                             pool=None, stop_event=None, progress=None, show_progress=True, resume=False, engine='asyncpraw', datatype='submissions',
+                             retry_failed=False, output_format='ndjson', output_options=None):
+    # A pool passed in by the caller is shared with other split files and stays open
+    owns_pool = pool is None
+    if owns_pool:
+        pool = AccountPool(load_credentials(auth_file), engine=engine)
+
+    # A split file an earlier run finished is skipped on resume
+    split_files = [] if resume and not retry_failed and split_file_finished(split_file) else [split_file]
+
+    def next_part():
+        if not split_files:
+            return None
+        return OUTPUTS[output_format](base_folder, dataset, datatype, split_files.pop(), pool.engine, resume=resume, retry_failed=retry_failed,
+                                      **(output_options or {}))
+
+    with tqdm(total=len(open_job_source(split_file, retry_failed)), desc=f"{os.path.basename(split_file)}", disable=not show_progress or progress is not None) as pbar:
+        try:
+            await scrape_pipeline(next_part, pool, batch_size=batch_size, reddit_batch_size=reddit_batch_size, concurrency=concurrency,
+                                  preserve_order=preserve_order, queue_size=queue_size, stop_event=stop_event,
+                                  progress=progress if progress is not None else pbar)
+        finally:
+            if owns_pool:
+                await pool.close()
+
+
+async def renew_leases(leases, held, interval):
+    """Renew the leases of the split files being scraped every interval seconds until cancelled.
+
+    Split files whose lease was lost are marked so the pipeline stops scraping them.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        renewed_at = time.time()
+        keys = list(held)
+        lost = set(leases.heartbeat(keys))
+        for key in keys:
+            part = held.get(key)
+            if part is None or part.lost:
+                continue
+            if key in lost:
+                part.lost = True
+                part.error_logger.error(f"Lease on {part.split_file} expired and may have been claimed by another worker, stopping it")
+            else:
+                part.lease_expires = renewed_at + leases.lease_seconds
+
+
+async def scrape_split_files(base_folder, dataset, split_files, auth_file, workers=1, engine='asyncpraw', resume=False, retry_failed=False,
+                             output_format='ndjson', output_options=None, metrics_file=None, metrics_interval=15, queue_file=None, lease_seconds=LEASE_SECONDS, **kwargs):
+    # split_files holds (datatype, split_file) pairs, handed out from a shared queue to `workers`
+    # pipelines that share one event loop and one account pool. Each file keeps its own output and logs.
+    # With a queue_file, split files are claimed from a lease table shared with other processes and
+    # hosts instead (see work_queue.py); a split file whose previous lease expired is resumed.
+    pool = AccountPool(load_credentials(auth_file), engine=engine)
+
+    # Split files an earlier run finished are skipped on resume
+    if resume and not retry_failed:
+        split_files = [(datatype, split_file) for datatype, split_file in split_files if not split_file_finished(split_file)]
+
+    # Run metrics are rewritten to a Prometheus textfile every metrics_interval seconds
+    if metrics_file is None:
+        metrics_file = os.path.join(base_folder, 'log', f'{dataset}_metrics.prom')
+    os.makedirs(os.path.dirname(metrics_file) or '.', exist_ok=True)
+    labels = {'dataset': dataset}
+
+    queue = asyncio.Queue()
+    leases = None
+    held = {}
+    if queue_file is None:
+        for job in split_files:
+            queue.put_nowait(job)
+    else:
+        leases = LeaseQueue(queue_file, lease_seconds=lease_seconds)
+        paths = {(datatype, split_name(split_file)): split_file for datatype, split_file in split_files}
+        leases.add(list(paths))
+
+    def next_job():
+        if leases is None:
+            try:
+                datatype, split_file = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return None
+            return datatype, split_file, resume, None
+
+        # Taken before the claim, so the lease is never assumed to last longer than it does
+        lease_expires = time.time() + leases.lease_seconds
+        claimed = leases.claim(paths)
+        if claimed is None:
+            return None
+        datatype, name, attempt = claimed
+        return datatype, paths[(datatype, name)], resume or attempt > 1, lease_expires
+
+    def next_part():
+        while True:
+            job = next_job()
+            if job is None:
+                return None
+            datatype, split_file, resume_part, lease_expires = job
+            if not (resume_part and not retry_failed and split_file_finished(split_file)):
+                break
+            # Finished by a worker that stopped before releasing its lease
+            if leases is not None:
+                leases.release((datatype, split_name(split_file)), True)
+
+        part = OUTPUTS[output_format](base_folder, dataset, datatype, split_file, engine, resume=resume_part, retry_failed=retry_failed,
+                                      **(output_options or {}))
+        if leases is not None:
+            key = (datatype, split_name(split_file))
+            part.lease_expires = lease_expires
+            held[key] = part
+
+            def release(finished):
+                # After a lost lease, this process may have claimed the split file again for a new part
+                if held.get(key) is part:
+                    del held[key]
+                    leases.release(key, finished)
+
+            part.on_close = release
+        return part
+
+    # The first SIGINT stops handing out new batches and lets in-flight ones finish writing;
+    # a second one interrupts immediately.
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def request_stop():
+        print("Stopping after in-flight batches, press Ctrl+C again to abort")
+        stop_event.set()
+        loop.remove_signal_handler(signal.SIGINT)
+
+    loop.add_signal_handler(signal.SIGINT, request_stop)
+
+    # Other processes share the work of a queue, so how many IDs this one gets is not known up front
+    total_ids = sum(len(open_job_source(split_file, retry_failed)) for _, split_file in split_files) if leases is None else None
+
+    exporter = asyncio.create_task(export_prometheus(pool.metrics, metrics_file, labels, metrics_interval))
+    renewer = asyncio.create_task(renew_leases(leases, held, lease_seconds / HEARTBEATS_PER_LEASE)) if leases is not None else None
+    with tqdm(total=total_ids, desc=dataset) as progress:
+        try:
+            await asyncio.gather(*[scrape_pipeline(next_part, pool, stop_event=stop_event, progress=progress, **kwargs) for _ in range(workers)])
+        finally:
+            exporter.cancel()
+            if renewer is not None:
+                renewer.cancel()
+                leases.close()
+            write_atomic(metrics_file, pool.metrics.to_prometheus(labels))
+            await pool.close()
+
+    return not stop_event.is_set()
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Scrape Reddit submissions using asyncPRAW')
-    parser.add_argument('--dataset', type=str, required=True, help='Dataset to scrape submissions for')
-    parser.add_argument('--auth', type=str, default='auth/AUTH.json', help='File containing Reddit API authentication data')
-    parser.add_argument('--datatype', type=str, choices=['submissions', 'comments'], default='submissions', help='Type of data to scrape')
+    parser = argparse.ArgumentParser(description='Scrape Reddit submissions and comments using asyncPRAW')
+    parser.add_argument('--dataset', type=str, required=True, help='Dataset to scrape')
+    parser.add_argument('--auth', type=str, default='auth/AUTH.json', help='File(s) containing Reddit API authentication data, comma-separated; each may hold one or a list of credentials')
+    parser.add_argument('--datatype', type=str, choices=['submissions', 'comments', 'both'], default='submissions', help='Type of data to scrape; "both" packs comment and submission IDs into the same info calls')
     parser.add_argument('--basefolder', type=str, default='', help='Base folder for data writing')
     parser.add_argument('--split_range', type=str, default=None, help='Range of split files to process (e.g., "1,5")')
+    parser.add_argument('--concurrency', type=int, default=1, help='Number of reddit.info batches in flight at once')
+    parser.add_argument('--preserve_order', action='store_true', help='Write records in the same order as the split file')
+    parser.add_argument('--workers', type=int, default=1, help='Number of split files to scrape concurrently')
+    parser.add_argument('--engine', type=str, choices=['asyncpraw', 'raw'], default='asyncpraw', help='Fetch through asyncpraw models or call /api/info directly and keep the raw JSON')
+    parser.add_argument('--seekable', action='store_true', help='Write an ID index next to each output file for fast lookups (see lookup_ids.py)')
+    parser.add_argument('--resume', action='store_true', help='Continue split files from their last checkpoint instead of starting over')
+    parser.add_argument('--output_format', type=str, choices=['ndjson', 'parquet', 'delta'], default='ndjson', help='Write .ndjson.zst files, one Parquet file per split file, or .ndjson.zst files plus deltas of what changed on later runs (see delta_output.py)')
+    parser.add_argument('--row_group_size', type=int, default=ROW_GROUP_SIZE, help='Records per Parquet row group')
+    parser.add_argument('--field_diffs', action='store_true', help='With delta output, write changed records as the fields that differ from the base snapshot')
+    parser.add_argument('--dictionary', action='store_true', help='Compress with the latest zstd dictionary trained on the output folder (see zstd_dict.py)')
+    parser.add_argument('--compression_threads', type=int, default=0, help='zstd worker threads per output file (0: compress on the calling thread, -1: one per core)')
+    parser.add_argument('--metrics_file', type=str, default=None, help='Prometheus textfile to export run metrics to (default: log/DATASET_metrics.prom)')
+    parser.add_argument('--metrics_interval', type=float, default=15, help='Seconds between rewrites of the metrics textfile')
+    parser.add_argument('--queue', type=str, default=None, help='SQLite lease table shared with other scraper processes and hosts; this process claims its split files (those in --split_range, if given) from it (see work_queue.py)')
+    parser.add_argument('--lease_seconds', type=float, default=LEASE_SECONDS, help='Seconds without a heartbeat after which a claimed split file is handed to another worker')
+    parser.add_argument('--retry_failed', '--retry-failed', action='store_true', help='Only scrape the IDs that previous runs gave up on, appending to the existing output')
     args = parser.parse_args()
+    if args.output_format == 'parquet' and (args.seekable or args.dictionary):
+        parser.error('--seekable and --dictionary only apply to ndjson and delta output')
+    if args.field_diffs and args.output_format != 'delta':
+        parser.error('--field_diffs only applies to delta output')
+
+    # Options of the output formats, each format's open_output takes the ones that apply to it
+    output_options = {'seekable': args.seekable, 'use_dictionary': args.dictionary, 'compression_threads': args.compression_threads,
+                      'row_group_size': args.row_group_size, 'field_diffs': args.field_diffs}
 
     dataset = args.dataset
+    datatypes = ['submissions', 'comments'] if args.datatype == 'both' else [args.datatype]
 
-    if args.datatype == 'submissions':
-        split_folder = os.path.join(args.basefolder, f'data/ids/batched/submission_ids_{dataset}')
+    split_files = []
+    for datatype in datatypes:
+        ids_name = f'{DATATYPES[datatype][0]}_{dataset}'
+        split_folder = os.path.join(args.basefolder, 'data/ids/batched', ids_name)
 
         if args.split_range:
             start, end = map(int, args.split_range.split(','))
-            split_files = [os.path.join(split_folder, f'submission_ids_{dataset}_{i:03}.txt') for i in range(start, end+1)]
+            datatype_files = [find_split_file(split_folder, f'{ids_name}_{i:03}') for i in range(start, end+1)]
         else:
-            split_files = [os.path.join(split_folder, f) for f in os.listdir(split_folder) if f.endswith('.txt')]
-
-        split_files.sort()
-
-        for split_file in split_files:
-            asyncio.run(scrape_submissions(args.basefolder, dataset, split_file, args.auth))
-
-    elif args.datatype == 'comments':
-        raise NotImplementedError("Comment scraping not implemented yet")
+            datatype_files = [os.path.join(split_folder, f) for f in os.listdir(split_folder) if is_split_file(f)]
+
+        if args.retry_failed:
+            failed_files = (failed_ids_path(split_file) for split_file in datatype_files)
+            datatype_files = [split_file for split_file, failed_file in zip(datatype_files, failed_files)
+                              if os.path.exists(failed_file) and os.path.getsize(failed_file) > 0]
+
+        split_files += [(datatype, split_file) for split_file in sorted(datatype_files)]
+
+    finished = asyncio.run(scrape_split_files(args.basefolder, dataset, split_files, args.auth, workers=args.workers,
+                                              concurrency=args.concurrency, preserve_order=args.preserve_order, resume=args.resume,
+                                              engine=args.engine, retry_failed=args.retry_failed,
+                                              output_format=args.output_format, output_options=output_options,
+                                              metrics_file=args.metrics_file, metrics_interval=args.metrics_interval,
+                                              queue_file=args.queue, lease_seconds=args.lease_seconds))
+    if not finished:
+        print(f"Interrupted scraping {dataset}")
+        raise SystemExit(130)
 
     print(f"Finished scraping {dataset}")
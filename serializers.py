@@ -0,0 +1,282 @@
+import json
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fields of a t3 (submission) object as returned by /api/info. They are copied as they are.
+SUBMISSION_FIELDS = (
+    'all_awardings', 'allow_live_comments', 'approved_at_utc', 'approved_by', 'archived', 'author',
+    'author_cakeday', 'author_flair_background_color', 'author_flair_css_class', 'author_flair_richtext',
+    'author_flair_template_id', 'author_flair_text', 'author_flair_text_color', 'author_flair_type',
+    'author_fullname', 'author_is_blocked', 'author_patreon_flair', 'author_premium', 'awarders',
+    'banned_at_utc', 'banned_by', 'call_to_action', 'can_gild', 'can_mod_post', 'category', 'clicked',
+    'collections', 'content_categories', 'contest_mode', 'created', 'created_utc', 'crosspost_parent',
+    'crosspost_parent_list', 'discussion_type', 'distinguished', 'domain', 'downs', 'edited',
+    'event_end', 'event_is_live', 'event_start', 'gallery_data', 'gilded', 'gildings', 'hidden',
+    'hide_score', 'id', 'is_created_from_ads_ui', 'is_crosspostable', 'is_gallery', 'is_meta',
+    'is_original_content', 'is_reddit_media_domain', 'is_robot_indexable', 'is_self', 'is_video',
+    'likes', 'link_flair_background_color', 'link_flair_css_class', 'link_flair_richtext',
+    'link_flair_template_id', 'link_flair_text', 'link_flair_text_color', 'link_flair_type', 'locked',
+    'media', 'media_embed', 'media_metadata', 'media_only', 'mod_note', 'mod_reason_by',
+    'mod_reason_title', 'mod_reports', 'name', 'no_follow', 'num_comments', 'num_crossposts',
+    'num_reports', 'over_18', 'permalink', 'pinned', 'poll_data', 'post_hint', 'preview', 'pwls',
+    'quarantine', 'removal_reason', 'removed_by', 'removed_by_category', 'report_reasons', 'saved',
+    'score', 'secure_media', 'secure_media_embed', 'selftext', 'send_replies', 'spoiler', 'stickied',
+    'subreddit', 'subreddit_id', 'subreddit_name_prefixed', 'subreddit_subscribers', 'subreddit_type',
+    'suggested_sort', 'thumbnail', 'thumbnail_height', 'thumbnail_width', 'title', 'top_awarded_type',
+    'total_awards_received', 'treatment_tags', 'ups', 'upvote_ratio', 'url', 'url_overridden_by_dest',
+    'user_reports', 'view_count', 'visited', 'whitelist_status', 'wls',
+)
+
+# Attributes asyncpraw sets on every Submission; kept so the output format does not change
+ASYNCPRAW_SUBMISSION_FIELDS = ('comment_limit', 'comment_sort', '_fetched', '_comments_by_id')
+
+DROPPED_SUBMISSION_FIELDS = ('_reddit', 'comments', 'selftext_html')
+
+# Fields of a t1 (comment) object as returned by /api/info
+COMMENT_FIELDS = (
+    'all_awardings', 'approved_at_utc', 'approved_by', 'archived', 'associated_award', 'author',
+    'author_cakeday', 'author_flair_background_color', 'author_flair_css_class', 'author_flair_richtext',
+    'author_flair_template_id', 'author_flair_text', 'author_flair_text_color', 'author_flair_type',
+    'author_fullname', 'author_is_blocked', 'author_patreon_flair', 'author_premium', 'awarders',
+    'banned_at_utc', 'banned_by', 'body', 'can_gild', 'can_mod_post', 'collapsed',
+    'collapsed_because_crowd_control', 'collapsed_reason', 'collapsed_reason_code', 'comment_type',
+    'controversiality', 'created', 'created_utc', 'distinguished', 'downs', 'edited', 'gilded', 'gildings',
+    'id', 'is_submitter', 'likes', 'link_id', 'locked', 'media_metadata', 'mod_note', 'mod_reason_by',
+    'mod_reason_title', 'mod_reports', 'name', 'no_follow', 'num_reports', 'parent_id', 'permalink',
+    'removal_reason', 'report_reasons', 'saved', 'score', 'score_hidden', 'send_replies', 'stickied',
+    'subreddit', 'subreddit_id', 'subreddit_name_prefixed', 'subreddit_type', 'top_awarded_type',
+    'total_awards_received', 'treatment_tags', 'unrepliable_reason', 'ups', 'user_reports',
+)
+
+ASYNCPRAW_COMMENT_FIELDS = ('_fetched',)
+
+DROPPED_COMMENT_FIELDS = ('_reddit', '_replies', '_submission', 'replies', 'body_html')
+
+
+def dumps(obj, default=None, sort_keys=False):
+    """Encode obj as JSON bytes, using orjson when it is installed.
+
+    Values orjson rejects (e.g. integers over 64 bits) are encoded with json instead. default is
+    called for objects neither can encode; without it they raise TypeError.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=orjson.OPT_SORT_KEYS if sort_keys else None)
+        except TypeError:
+            pass
+    return json.dumps(obj, default=default, sort_keys=sort_keys).encode('utf-8')
+
+
+def loads(data):
+    """Decode JSON bytes or str, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def convert_author(author):
+    return author.name if author else None
+
+
+def convert_subreddit(subreddit):
+    return subreddit.display_name
+
+
+def convert_poll_data(poll_data):
+    if not poll_data:
+        return None
+    return {
+        'options': [
+            {
+                'text': option.text,
+                'vote_count': option.vote_count,
+                'id': option.id
+            }
+            for option in poll_data.options
+        ] if hasattr(poll_data, 'options') else [],
+        'total_vote_count': poll_data.total_vote_count if hasattr(poll_data, 'total_vote_count') else None,
+        'user_selection': poll_data.user_selection.text if hasattr(poll_data, 'user_selection') and poll_data.user_selection else None,
+        'voting_end_timestamp': poll_data.voting_end_timestamp if hasattr(poll_data, 'voting_end_timestamp') else None
+    }
+
+
+SUBMISSION_CONVERTERS = {
+    'author': convert_author,
+    'subreddit': convert_subreddit,
+    'poll_data': convert_poll_data,
+}
+
+COMMENT_CONVERTERS = {
+    'author': convert_author,
+    'subreddit': convert_subreddit,
+}
+
+
+class ItemSerializer:
+    """Turns asyncpraw model objects into ndjson lines following an explicit field schema.
+
+    Records are encoded once. Fields outside the schema are still written, but are only reported
+    the first time they are seen; a record is checked key by key only if encoding it fails.
+    """
+
+    item_name = 'item'
+    FIELDS = ()
+    CONVERTERS = {}
+    DROPPED_FIELDS = ()
+
+    def __init__(self, scrape_logger=None, error_logger=None, fields=None, converters=None, dropped_fields=None):
+        self.scrape_logger = scrape_logger
+        self.error_logger = error_logger
+        self.fields = frozenset(self.FIELDS if fields is None else fields)
+        self.converters = self.CONVERTERS if converters is None else converters
+        self.dropped_fields = frozenset(self.DROPPED_FIELDS if dropped_fields is None else dropped_fields)
+        self.unknown_fields = set()
+
+    def _report_unknown(self, key, value):
+        self.unknown_fields.add(key)
+        if self.scrape_logger is not None:
+            self.scrape_logger.warning(f"Field not in {self.item_name} schema: {key} ({type(value).__name__})")
+
+    def extract(self, item):
+        record = {}
+        converters = self.converters
+        for key, value in vars(item).items():
+            if key in self.dropped_fields:
+                continue
+            converter = converters.get(key)
+            if converter is not None:
+                value = converter(value)
+            elif key not in self.fields and key not in self.unknown_fields:
+                self._report_unknown(key, value)
+            record[key] = value
+        return record
+
+    def _report_non_serializable(self, record, item_id):
+        non_serializable_keys = []
+        for key, value in record.items():
+            try:
+                json.dumps(value)
+            except TypeError:
+                non_serializable_keys.append(key)
+
+        if self.error_logger is not None:
+            self.error_logger.error(f"Non-serializable objects found in {self.item_name} {item_id}: {', '.join(non_serializable_keys)}")
+
+    def item_id(self, item):
+        return item.id
+
+    def record(self, item):
+        """Return the cleaned-up record dict of an item, as serialize() would write it."""
+        record = self.extract(item)
+        record['retrieved_utc'] = int(time.time())
+        return record
+
+    def encode(self, record, item_id):
+        """Return the ndjson line for a record, or None if it cannot be serialized."""
+        try:
+            return dumps(record) + b'\n'
+        except TypeError:
+            self._report_non_serializable(record, item_id)
+            return None
+
+    def serialize(self, item):
+        """Return the ndjson line for an item, or None if it cannot be serialized."""
+        return self.encode(self.record(item), self.item_id(item))
+
+
+class RawItemSerializer(ItemSerializer):
+    """Serializes the data dicts returned by raw_info, applying the same cleanup as for asyncpraw objects."""
+
+    def item_id(self, item):
+        return item['id']
+
+    def extract(self, item):
+        for key in self.dropped_fields:
+            item.pop(key, None)
+        for key, converter in self.converters.items():
+            if key in item:
+                item[key] = converter(item[key])
+        if not self.fields.issuperset(item):
+            for key in item.keys() - self.fields - self.unknown_fields:
+                self._report_unknown(key, item[key])
+        return item
+
+
+class SubmissionSerializer(ItemSerializer):
+    item_name = 'submission'
+    FIELDS = SUBMISSION_FIELDS + ASYNCPRAW_SUBMISSION_FIELDS
+    CONVERTERS = SUBMISSION_CONVERTERS
+    DROPPED_FIELDS = DROPPED_SUBMISSION_FIELDS
+
+
+class CommentSerializer(ItemSerializer):
+    item_name = 'comment'
+    FIELDS = COMMENT_FIELDS + ASYNCPRAW_COMMENT_FIELDS
+    CONVERTERS = COMMENT_CONVERTERS
+    DROPPED_FIELDS = DROPPED_COMMENT_FIELDS
+
+
+def convert_raw_author(author):
+    # asyncpraw turns deleted authors into None
+    return None if author == '[deleted]' else author
+
+
+def convert_raw_poll_data(poll_data):
+    # asyncpraw wraps a null poll_data in an empty PollData, which the asyncpraw path writes out like this
+    if poll_data is None:
+        poll_data = {}
+    options = poll_data.get('options', [])
+    user_selection = poll_data.get('user_selection')
+    return {
+        'options': [
+            {
+                'text': option.get('text'),
+                'vote_count': option.get('vote_count'),
+                'id': option.get('id')
+            }
+            for option in options
+        ],
+        'total_vote_count': poll_data.get('total_vote_count'),
+        'user_selection': next((option.get('text') for option in options if option.get('id') == user_selection), None) if user_selection else None,
+        'voting_end_timestamp': poll_data.get('voting_end_timestamp')
+    }
+
+
+RAW_SUBMISSION_CONVERTERS = {
+    'author': convert_raw_author,
+    'poll_data': convert_raw_poll_data,
+}
+
+RAW_COMMENT_CONVERTERS = {
+    'author': convert_raw_author,
+}
+
+
+class RawSubmissionSerializer(RawItemSerializer):
+    item_name = 'submission'
+    FIELDS = SUBMISSION_FIELDS
+    CONVERTERS = RAW_SUBMISSION_CONVERTERS
+    DROPPED_FIELDS = DROPPED_SUBMISSION_FIELDS
+
+
+class RawCommentSerializer(RawItemSerializer):
+    item_name = 'comment'
+    FIELDS = COMMENT_FIELDS
+    CONVERTERS = RAW_COMMENT_CONVERTERS
+    DROPPED_FIELDS = DROPPED_COMMENT_FIELDS
+
+
+SERIALIZERS = {
+    ('submissions', 'asyncpraw'): SubmissionSerializer,
+    ('submissions', 'raw'): RawSubmissionSerializer,
+    ('comments', 'asyncpraw'): CommentSerializer,
+    ('comments', 'raw'): RawCommentSerializer,
+}
+
+
+def make_serializer(datatype, engine, scrape_logger=None, error_logger=None):
+    return SERIALIZERS[(datatype, engine)](scrape_logger, error_logger)
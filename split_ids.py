@@ -1,46 +1,158 @@
 import argparse
-import csv
 import os
 
-def read_ids(filename):
-    """Read IDs from a CSV file."""
-    with open(filename, mode='r', newline='') as file:
-        reader = csv.reader(file)
-        ids = [row[0] for row in reader if row]  # assuming each line has a single ID
-    return ids
-
-def filter_ids(ids, remove_file):
-    """Filter out IDs listed in the remove_file."""
-    remove_ids = set(read_ids(remove_file))
-    return [id_ for id_ in ids if id_ not in remove_ids]
-
-def split_ids(ids, original_filename, batch_size):
-    """Split IDs into multiple files and save in a specific directory."""
-    base_dir = os.path.dirname(original_filename)
-    base_name = os.path.basename(original_filename).replace('.csv', '')
-    batch_dir = os.path.join(base_dir, 'batched', base_name)
-    
-    os.makedirs(batch_dir, exist_ok=True)
-    
-    for i in range(0, len(ids), batch_size):
-        batch_filename = os.path.join(batch_dir, f"{base_name}_{(i // batch_size) + 1:03}.txt")
-        with open(batch_filename, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerows([[id_] for id_ in ids[i:i+batch_size]])
+import numpy as np
+import zstandard as zstd
+
+from reddit_ids import decode_base36_array, encode_base36_lines
+
+CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def iter_id_chunks(filename, chunk_bytes=CHUNK_BYTES):
+    """Stream IDs from a one-column CSV as NumPy bytes arrays of at most ~chunk_bytes each."""
+    with open(filename, mode='rb') as file:
+        remainder = b''
+        while True:
+            block = file.read(chunk_bytes)
+            if not block:
+                break
+            block = remainder + block
+            cut = block.rfind(b'\n') + 1
+            if cut == 0:
+                remainder = block
+                continue
+            block, remainder = block[:cut], block[cut:]
+            ids = [line for line in block.replace(b'\r', b'').split(b'\n') if line]
+            if ids:
+                yield np.array(ids, dtype=bytes)
+        ids = [line for line in remainder.replace(b'\r', b'').split(b'\n') if line]
+        if ids:
+            yield np.array(ids, dtype=bytes)
+
+
+def read_id_array(filename):
+    """Read IDs from a CSV file as a sorted, unique int64 array."""
+    chunks = [np.unique(decode_base36_array(ids)) for ids in iter_id_chunks(filename)]
+    return np.unique(np.concatenate(chunks)) if chunks else np.zeros(0, dtype=np.int64)
+
+
+def anti_join(values, remove_ids):
+    """Return a mask of the values not present in the sorted remove_ids array."""
+    if len(remove_ids) == 0:
+        return np.ones(len(values), dtype=bool)
+    positions = np.searchsorted(remove_ids, values).clip(max=len(remove_ids) - 1)
+    return remove_ids[positions] != values
+
+
+class BatchWriter:
+    """Writes IDs into numbered batch files of batch_size lines, opening the next file as each one fills."""
+
+    def __init__(self, original_filename, batch_size, compress=False):
+        base_dir = os.path.dirname(original_filename)
+        self.base_name = os.path.basename(original_filename).replace('.csv', '')
+        self.batch_dir = os.path.join(base_dir, 'batched', self.base_name)
+        self.batch_size = batch_size
+        self.compress = compress
+        self.batch_number = 0
+        self.batch_count = 0
+        self.file = None
+        self.raw_file = None
+
+        os.makedirs(self.batch_dir, exist_ok=True)
+
+    def _next_file(self):
+        self.close()
+        self.batch_number += 1
+        self.batch_count = 0
+        batch_filename = os.path.join(self.batch_dir, f"{self.base_name}_{self.batch_number:03}.txt")
+        if self.compress:
+            self.raw_file = open(batch_filename + '.zst', mode='wb')
+            self.file = zstd.ZstdCompressor(level=10).stream_writer(self.raw_file)
+        else:
+            self.file = open(batch_filename, mode='wb')
+
+    def write(self, lines):
+        """Write a bytes array of IDs (without newlines)."""
+        self._write(lines, lambda part: b'\n'.join(part.tolist()) + b'\n')
+
+    def write_values(self, values):
+        """Write an int64 array of decoded IDs."""
+        self._write(values, encode_base36_lines)
+
+    def _write(self, items, encode):
+        start = 0
+        while start < len(items):
+            if self.file is None or self.batch_count == self.batch_size:
+                self._next_file()
+            end = start + self.batch_size - self.batch_count
+            part = items[start:end]
+            self.file.write(encode(part))
+            self.batch_count += len(part)
+            start = end
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.raw_file is not None:
+            self.raw_file.close()
+            self.raw_file = None
+
+
+def split_ids(filename, batch_size, remove_file=None, dedup=False, sort=None, compress=False):
+    """Split IDs into multiple files and save in a specific directory, optionally removing, deduplicating and sorting them.
+
+    IDs are streamed in chunks and handled as int64. Only deduplication and sorting keep all IDs in memory
+    (8 bytes each); otherwise IDs are written out as they are read.
+    """
+    remove_ids = read_id_array(remove_file) if remove_file else None
+    writer = BatchWriter(filename, batch_size, compress)
+    kept = []
+
+    try:
+        for ids in iter_id_chunks(filename):
+            values = decode_base36_array(ids)
+            if remove_ids is not None:
+                mask = anti_join(values, remove_ids)
+                ids, values = ids[mask], values[mask]
+
+            if dedup or sort:
+                kept.append(values)
+            else:
+                writer.write(ids)
+
+        if dedup or sort:
+            values = np.concatenate(kept) if kept else np.zeros(0, dtype=np.int64)
+            del kept
+            if dedup and sort:
+                values = np.unique(values)
+            elif dedup:
+                # Keep the first occurrence of each ID in input order
+                values = values[np.sort(np.unique(values, return_index=True)[1])]
+            else:
+                values = np.sort(values)
+            if sort == 'desc':
+                values = values[::-1]
+            writer.write_values(values)
+    finally:
+        writer.close()
+
+    return writer.batch_number
+
 
 def main():
     parser = argparse.ArgumentParser(description="Process Reddit IDs from a CSV file.")
     parser.add_argument('--filename', type=str, help='The CSV file containing Reddit IDs')
     parser.add_argument('--remove', type=str, help='Optional file with IDs to remove', required=False)
     parser.add_argument('--batch_size', type=int, default=1000000, help='Number of IDs per file (default: 1,000,000)')
-    
+    parser.add_argument('--dedup', action='store_true', help='Drop duplicate IDs')
+    parser.add_argument('--sort', type=str, choices=['asc', 'desc'], default=None, help='Sort IDs in the batch files (default: input order)')
+    parser.add_argument('--compress', action='store_true', help='Write zstd-compressed .txt.zst batch files')
+
     args = parser.parse_args()
-    
-    ids = read_ids(args.filename)
-    if args.remove:
-        ids = filter_ids(ids, args.remove)
-    
-    split_ids(ids, args.filename, args.batch_size)
+
+    split_ids(args.filename, args.batch_size, args.remove, dedup=args.dedup, sort=args.sort, compress=args.compress)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,164 @@
+import argparse
+import os
+import socket
+import sqlite3
+import time
+import uuid
+
+# A lease that has not been renewed for LEASE_SECONDS is considered abandoned and handed out again.
+# Holders renew theirs every LEASE_SECONDS / HEARTBEATS_PER_LEASE seconds.
+LEASE_SECONDS = 300
+HEARTBEATS_PER_LEASE = 3
+# Seconds to wait for another process holding the database lock
+BUSY_TIMEOUT = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    datatype TEXT NOT NULL,
+    split_file TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    finished_at REAL,
+    PRIMARY KEY (datatype, split_file)
+)
+"""
+
+
+def default_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaseQueue:
+    """Lease table of split files in a SQLite database, shared by scraper processes on one or more hosts.
+
+    Split files are keyed by (datatype, split name) so hosts can keep their ID files under different
+    base folders. A worker claims a pending split file (or one whose lease expired), renews the lease
+    while it works on it and releases it when done; a released unfinished file becomes pending again.
+    Claims run in an immediate transaction, so no two workers get the same file. Hosts sharing the
+    database over a network filesystem need working POSIX locks on it (e.g. NFSv4) and clocks that
+    agree to well within LEASE_SECONDS.
+    """
+
+    def __init__(self, filename, owner=None, lease_seconds=LEASE_SECONDS):
+        self.filename = filename
+        self.owner = owner or default_owner()
+        self.lease_seconds = lease_seconds
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        # Autocommit mode, transactions are opened explicitly
+        self.conn = sqlite3.connect(filename, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.conn.execute(SCHEMA)
+
+    def add(self, keys):
+        """Add (datatype, split name) keys to the table; keys already in it keep their state."""
+        with self.transaction():
+            self.conn.executemany("INSERT OR IGNORE INTO leases (datatype, split_file) VALUES (?, ?)", keys)
+
+    def claim(self, keys=None):
+        """Lease the first pending or expired split file (among keys, if given) and return (datatype, split name, attempt), or None."""
+        keys = None if keys is None else set(keys)
+        now = time.time()
+        with self.transaction():
+            rows = self.conn.execute(
+                "SELECT datatype, split_file, attempts FROM leases "
+                "WHERE status = 'pending' OR (status = 'leased' AND expires < ?) ORDER BY datatype, split_file",
+                (now,),
+            ).fetchall()
+            for datatype, split_file, attempts in rows:
+                if keys is not None and (datatype, split_file) not in keys:
+                    continue
+                self.conn.execute(
+                    "UPDATE leases SET status = 'leased', owner = ?, expires = ?, attempts = attempts + 1 "
+                    "WHERE datatype = ? AND split_file = ?",
+                    (self.owner, now + self.lease_seconds, datatype, split_file),
+                )
+                return datatype, split_file, attempts + 1
+        return None
+
+    def heartbeat(self, keys):
+        """Renew the leases held on keys and return the keys whose lease was lost to another worker."""
+        lost = []
+        with self.transaction():
+            for datatype, split_file in keys:
+                cur = self.conn.execute(
+                    "UPDATE leases SET expires = ? WHERE datatype = ? AND split_file = ? AND owner = ? AND status = 'leased'",
+                    (time.time() + self.lease_seconds, datatype, split_file, self.owner),
+                )
+                if cur.rowcount == 0:
+                    lost.append((datatype, split_file))
+        return lost
+
+    def release(self, key, finished):
+        """Mark a leased split file as done, or as pending again if it was not finished."""
+        with self.transaction():
+            if finished:
+                self.conn.execute(
+                    "UPDATE leases SET status = 'done', owner = NULL, expires = NULL, finished_at = ? "
+                    "WHERE datatype = ? AND split_file = ? AND owner = ?",
+                    (time.time(), *key, self.owner),
+                )
+            else:
+                self.conn.execute(
+                    "UPDATE leases SET status = 'pending', owner = NULL, expires = NULL WHERE datatype = ? AND split_file = ? AND owner = ?",
+                    (*key, self.owner),
+                )
+
+    def requeue(self, status='leased'):
+        """Make every split file with the given status pending again and return how many there were."""
+        with self.transaction():
+            return self.conn.execute(
+                "UPDATE leases SET status = 'pending', owner = NULL, expires = NULL WHERE status = ?", (status,)
+            ).rowcount
+
+    def counts(self):
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM leases GROUP BY status").fetchall())
+
+    def leases(self):
+        """Return (datatype, split name, owner, seconds until expiry, attempts) of the split files currently leased."""
+        rows = self.conn.execute(
+            "SELECT datatype, split_file, owner, expires, attempts FROM leases WHERE status = 'leased' ORDER BY expires"
+        ).fetchall()
+        now = time.time()
+        return [(datatype, split_file, owner, expires - now, attempts) for datatype, split_file, owner, expires, attempts in rows]
+
+    def transaction(self):
+        return _Transaction(self.conn)
+
+    def close(self):
+        self.conn.close()
+
+
+class _Transaction:
+    # BEGIN IMMEDIATE takes the write lock up front, so two claims cannot both read the same pending row
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show or reset the lease table shared by scrapers started with --queue')
+    parser.add_argument('queue', type=str, help='SQLite lease database')
+    parser.add_argument('--requeue', type=str, choices=['leased', 'done'], default=None, help='Make all leased (e.g. after killing every worker) or done split files pending again')
+    args = parser.parse_args()
+
+    queue = LeaseQueue(args.queue)
+    if args.requeue:
+        print(f"Requeued {queue.requeue(args.requeue)} {args.requeue} split files")
+
+    counts = queue.counts()
+    print(', '.join(f"{status}: {counts.get(status, 0)}" for status in ('pending', 'leased', 'done')))
+    for datatype, split_file, owner, remaining, attempts in queue.leases():
+        state = f"expires in {remaining:.0f}s" if remaining > 0 else f"expired {-remaining:.0f}s ago"
+        print(f"{datatype} {split_file}: {owner}, {state}, attempt {attempts}")
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import argparse
+import os
+import random
+import re
+
+import zstandard as zstd
+
+# Trained dictionaries live next to the output they compress as zstd_dict_v{version}.dict. Every frame
+# written with a dictionary names it by ID in its header, so readers pick the right one per frame and
+# files written before (or without) a dictionary stay readable.
+DICT_FILE = re.compile(r'^zstd_dict_v(\d+)\.dict$')
+DICT_SIZE = 112640
+MAX_SAMPLES = 100000
+# Largest possible zstd frame header, enough to read the dictionary ID
+FRAME_HEADER_MAX = 18
+
+
+def dictionary_path(folder, version):
+    return os.path.join(folder, f"zstd_dict_v{version}.dict")
+
+
+def dictionary_versions(folder):
+    """Return the dictionary versions stored in folder, oldest first."""
+    if not os.path.isdir(folder):
+        return []
+    return sorted(int(match.group(1)) for match in map(DICT_FILE.match, os.listdir(folder)) if match)
+
+
+def read_dictionary(filename):
+    with open(filename, 'rb') as f:
+        return zstd.ZstdCompressionDict(f.read())
+
+
+def latest_dictionary(folder):
+    """Return the newest dictionary in folder, or None if there is none."""
+    versions = dictionary_versions(folder)
+    if not versions:
+        return None
+    return read_dictionary(dictionary_path(folder, versions[-1]))
+
+
+def load_dictionaries(folder):
+    """Return {dictionary ID: dictionary} for all dictionaries stored in folder."""
+    dictionaries = {}
+    for version in dictionary_versions(folder):
+        dictionary = read_dictionary(dictionary_path(folder, version))
+        dictionaries[dictionary.dict_id()] = dictionary
+    return dictionaries
+
+
+class FrameDecompressors:
+    """Hands out a decompressor for each frame, loaded with the dictionary its header asks for."""
+
+    def __init__(self, dictionaries=None):
+        self.dictionaries = dictionaries or {}
+        self._dctx = {0: zstd.ZstdDecompressor()}
+
+    @classmethod
+    def for_file(cls, outfile):
+        return cls(load_dictionaries(os.path.dirname(outfile)))
+
+    def for_frame(self, data):
+        dict_id = zstd.get_frame_parameters(data).dict_id
+        if dict_id not in self._dctx:
+            if dict_id not in self.dictionaries:
+                raise ValueError(f"Frame was compressed with zstd dictionary {dict_id}, which was not found")
+            self._dctx[dict_id] = zstd.ZstdDecompressor(dict_data=self.dictionaries[dict_id])
+        return self._dctx[dict_id]
+
+    def decompress(self, frame):
+        return self.for_frame(frame).decompressobj().decompress(frame)
+
+
+def iter_frames(f, chunk_size=2**20, decompressors=None):
+    """Yield (offset, compressed size, decompressed data) for each complete zstd frame in f."""
+    decompressors = decompressors or FrameDecompressors()
+    offset = 0
+    pending = b''
+    while True:
+        while len(pending) < FRAME_HEADER_MAX:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            pending += chunk
+        if not pending:
+            return
+        try:
+            dobj = decompressors.for_frame(pending).decompressobj()
+        except zstd.ZstdError:
+            return  # Truncated header of an incomplete last frame
+
+        chunks = []
+        fed = 0
+        while not dobj.eof:
+            chunk = pending or f.read(chunk_size)
+            pending = b''
+            if not chunk:
+                return
+            chunks.append(dobj.decompress(chunk))
+            fed += len(chunk)
+        pending = dobj.unused_data
+        frame_size = fed - len(pending)
+        yield offset, frame_size, b''.join(chunks)
+        offset += frame_size
+
+
+def iter_lines(outfile):
+    """Yield the ndjson lines of an output file, whichever dictionaries its frames were written with."""
+    with open(outfile, 'rb') as f:
+        for _, _, data in iter_frames(f, decompressors=FrameDecompressors.for_file(outfile)):
+            yield from data.splitlines(keepends=True)
+
+
+def sample_records(output_files, max_samples=MAX_SAMPLES):
+    """Take up to max_samples records spread evenly over output_files."""
+    samples = []
+    per_file = max(max_samples // max(len(output_files), 1), 1)
+    for outfile in output_files:
+        for i, line in enumerate(iter_lines(outfile)):
+            if i == per_file:
+                break
+            samples.append(line)
+    return samples[:max_samples]
+
+
+def unused_dict_id(existing_ids):
+    # IDs below 32768 and from 2**31 on are reserved by the zstd format
+    while True:
+        dict_id = random.randrange(32768, 2**31)
+        if dict_id not in existing_ids:
+            return dict_id
+
+
+def train_dictionary(folder, dict_size=DICT_SIZE, max_samples=MAX_SAMPLES, threads=-1):
+    """Train a dictionary on the .ndjson.zst files in folder and store it as the next version. Returns its path.
+
+    If the folder already holds the same dictionary, no new version is written and its path is returned.
+    """
+    output_files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.ndjson.zst'))
+    samples = sample_records(output_files, max_samples)
+    if not samples:
+        raise ValueError(f"No records to train a dictionary on in {folder}")
+
+    versions = dictionary_versions(folder)
+    existing = {read_dictionary(dictionary_path(folder, version)).dict_id(): version for version in versions}
+    dictionary = zstd.train_dictionary(dict_size, samples, threads=threads)
+    if dictionary.dict_id() in existing:
+        # Training is deterministic: the same samples give the same dictionary, which is kept as it is
+        filename = dictionary_path(folder, existing[dictionary.dict_id()])
+        if read_dictionary(filename).as_bytes() == dictionary.as_bytes():
+            return filename
+        dictionary = zstd.train_dictionary(dict_size, samples, threads=threads, dict_id=unused_dict_id(existing))
+
+    filename = dictionary_path(folder, versions[-1] + 1 if versions else 1)
+    with open(filename, 'wb') as f:
+        f.write(dictionary.as_bytes())
+    return filename
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a zstd dictionary on scraped output (used with --dictionary when scraping).")
+    parser.add_argument('--dataset', type=str, required=True, help='Dataset whose output to sample')
+    parser.add_argument('--datatype', type=str, choices=['submissions', 'comments'], default='submissions', help='Type of data to sample')
+    parser.add_argument('--basefolder', type=str, default='', help='Base folder of the data')
+    parser.add_argument('--dict_size', type=int, default=DICT_SIZE, help='Dictionary size in bytes')
+    parser.add_argument('--samples', type=int, default=MAX_SAMPLES, help='Maximum number of records to train on')
+    args = parser.parse_args()
+
+    folder = os.path.join(args.basefolder, f'data/{args.datatype}_{args.dataset}')
+    filename = train_dictionary(folder, args.dict_size, args.samples)
+    print(f"Dictionary: {filename}")
+
+
+if __name__ == "__main__":
+    main()